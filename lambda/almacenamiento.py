@@ -0,0 +1,162 @@
+import os
+import serializacion
+from abc import ABC, abstractmethod
+from utils import es_menu_compacto, expandir_menu_compacto
+
+# Tamaño de página del historial
+HISTORIAL_POR_PAGINA = 10
+HISTORIAL_MAX_POR_PAGINA = 50
+
+class Almacenamiento(ABC):
+    """
+    Interfaz común de los backends de almacenamiento
+    
+    Las rutas del handler solo usan estos métodos, por lo que cualquier
+    backend (Keyspaces, SQLite local) puede sustituir a otro. Los métodos
+    abstractos son obligatorios; el resto tiene un comportamiento por
+    defecto que cada backend puede mejorar.
+    """
+    
+    def __init__(self):
+        self.session = None
+        
+        # Tiempos de arranque (importación del driver y conexión)
+        self.tiempos = {}
+    
+    @abstractmethod
+    def connect(self, preparar_consultas=False):
+        """Abre la conexión; tras llamarlo `session` no es None"""
+    
+    @abstractmethod
+    def close(self):
+        """Cierra la conexión"""
+    
+    def estadisticas_consultas(self):
+        """Métricas propias del backend"""
+        return {}
+    
+    def estadisticas_conexion(self):
+        """Métricas del driver y de la conexión"""
+        return {}
+    
+    def asegurar_sesion(self):
+        """Devuelve una sesión utilizable, conectando si hace falta"""
+        if self.session is None:
+            self.connect()
+        return self.session
+    
+    @abstractmethod
+    def get_all_platos(self):
+        """Lista de platos con 'ingredientes' como JSON string"""
+    
+    @abstractmethod
+    def get_all_ingredientes(self):
+        """Dict nombre -> info de todos los ingredientes"""
+    
+    @abstractmethod
+    def get_ingrediente_info(self, nombre):
+        """Info de un ingrediente o None"""
+    
+    @abstractmethod
+    def get_ingredientes_info(self, nombres):
+        """Dict nombre -> info de los ingredientes existentes"""
+    
+    @abstractmethod
+    def get_ingrediente_precio(self, nombre):
+        """Precio (Decimal) de un ingrediente"""
+    
+    @abstractmethod
+    def get_ingrediente_categoria(self, nombre):
+        """Categoría de un ingrediente ('otros' si no existe)"""
+    
+    @abstractmethod
+    def save_menu(self, user_id, presupuesto, menu_json, lista_json):
+        """Guarda un menú generado"""
+    
+    @abstractmethod
+    def save_menus(self, registros):
+        """Guarda muchos menús; devuelve cuántos se guardaron"""
+    
+    def save_menu_async(self, user_id, presupuesto, menu_json, lista_json):
+        """Guarda un menú sin bloquear; por defecto es síncrono"""
+        self.save_menu(user_id, presupuesto, menu_json, lista_json)
+    
+    def flush_escrituras(self, timeout=None):
+        """Espera a las escrituras pendientes; True si no queda ninguna"""
+        return True
+    
+    def estadisticas_escrituras(self):
+        """Contadores de escrituras diferidas"""
+        return {}
+    
+    def get_user_menus(self, user_id):
+        """Obtiene los menús de un usuario (primera página)"""
+        return self.get_user_menus_pagina(user_id)['menus']
+    
+    @abstractmethod
+    def get_user_menus_pagina(self, user_id, limite=HISTORIAL_POR_PAGINA, pagina=None, resumen=False):
+        """Página del historial: dict con 'menus' y 'siguientePagina'"""
+    
+    @abstractmethod
+    def get_user_menu(self, user_id, fecha_generacion):
+        """Menú completo por (user_id, fecha_generacion) o None"""
+    
+    @abstractmethod
+    def get_features_platos(self):
+        """Dict plato_id -> (selecciones, suma_satisfaccion, valoraciones)"""
+    
+    def get_version_catalogo(self):
+        """Sello de versión del catálogo publicado en la base ('' si no hay)"""
+        return ''
+    
+    @abstractmethod
+    def marcar_feedback(self, user_id, fecha_generacion):
+        """Marca un menú como valorado; True si no tenía feedback"""
+    
+    @abstractmethod
+    def desmarcar_feedback(self, user_id, fecha_generacion):
+        """Quita la marca de feedback de un menú"""
+    
+    @abstractmethod
+    def registrar_feedback_platos(self, conteo, satisfaccion):
+        """Suma a los agregados de cada plato sus apariciones en un menú valorado"""
+    
+    @abstractmethod
+    def get_training_data(self):
+        """Datos de entrenamiento del modelo"""
+    
+    @staticmethod
+    def _menu_desde_blobs(fecha, presupuesto, menu_json, lista_json):
+        """Convierte una fila completa de menus_generados en dict"""
+        menu = serializacion.loads(menu_json)
+        # Los menús nuevos se guardan en formato compacto
+        if es_menu_compacto(menu):
+            menu = expandir_menu_compacto(menu)
+        
+        return {
+            'fecha': fecha.isoformat(),
+            'presupuesto': float(presupuesto),
+            'menu': menu,
+            'lista_compras': serializacion.loads(lista_json)
+        }
+
+def crear_conexion(backend=None):
+    """
+    Crea el backend de almacenamiento configurado
+    
+    Args:
+        backend: 'keyspaces' o 'sqlite'; por defecto STORAGE_BACKEND o 'keyspaces'
+        
+    Returns:
+        Instancia de Almacenamiento sin conectar
+    """
+    backend = backend or os.environ.get('STORAGE_BACKEND', 'keyspaces')
+    
+    if backend == 'sqlite':
+        from database_sqlite import SQLiteConnection
+        return SQLiteConnection()
+    if backend == 'keyspaces':
+        from database import KeyspacesConnection
+        return KeyspacesConnection()
+    
+    raise ValueError(f"Backend de almacenamiento desconocido: {backend}")
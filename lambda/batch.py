@@ -0,0 +1,164 @@
+import os
+import uuid
+import serializacion
+import instrumentacion
+from paralelo import map_en_procesos, procesos_disponibles
+from utils import (
+    calcular_lista_compras,
+    calcular_info_nutricional,
+    formatear_menu_compacto
+)
+
+def generar_menu_usuario(modelo, catalogo_ingredientes, presupuesto,
+                         preferencias_tipo, preferencias_categoria, modo=None):
+    """
+    Ejecuta el pipeline completo de un menú sin tocar la base de datos
+    
+    Args:
+        modelo: MenuMLLite ya entrenado
+        catalogo_ingredientes: Fuente de ingredientes para la lista de compras
+        presupuesto: Presupuesto semanal
+        preferencias_tipo: Lista de tipos de comida preferidos
+        preferencias_categoria: Lista de categorías preferidas
+        modo: Modo de generación ('optimo' o heurístico por defecto)
+        
+    Returns:
+        Tuple con (menu_semanal, lista_compras, info_nutricional)
+    """
+    modelo.usar_catalogo(catalogo_ingredientes)
+    with instrumentacion.etapa('generacion_menu'):
+        menu_semanal = modelo.generar_menu_semanal(
+            presupuesto=presupuesto,
+            preferencias_tipo=preferencias_tipo,
+            preferencias_categoria=preferencias_categoria,
+            modo=modo
+        )
+    with instrumentacion.etapa('lista_compras'):
+        lista_compras = calcular_lista_compras(menu_semanal, catalogo_ingredientes)
+    with instrumentacion.etapa('info_nutricional'):
+        info_nutricional = calcular_info_nutricional(menu_semanal)
+    
+    return menu_semanal, lista_compras, info_nutricional
+
+def generar_semanas_usuario(modelo, catalogo_ingredientes, presupuesto, semanas,
+                            preferencias_tipo, preferencias_categoria, modo=None):
+    """
+    Planifica varias semanas seguidas arrastrando el estado de variedad
+    
+    Yields:
+        Tuple (numero_semana, menu_semanal, lista_compras, info_nutricional)
+        en cuanto cada semana está lista
+    """
+    modelo.usar_catalogo(catalogo_ingredientes)
+    for numero, menu_semanal in modelo.planificar_semanas(
+        presupuesto, semanas, preferencias_tipo, preferencias_categoria, modo=modo
+    ):
+        lista_compras = calcular_lista_compras(menu_semanal, catalogo_ingredientes)
+        info_nutricional = calcular_info_nutricional(menu_semanal)
+        yield numero, menu_semanal, lista_compras, info_nutricional
+
+def normalizar_solicitud(params):
+    """Convierte un item del lote en (user_id, presupuesto, tipos, categorias)"""
+    return (
+        uuid.UUID(str(params.get('userId') or uuid.uuid4())),
+        float(params.get('presupuesto', 200)),
+        params.get('tipoComida', []),
+        params.get('categoria', [])
+    )
+
+def _procesar_solicitud(modelo, catalogo_ingredientes, solicitud, solo_menu=False):
+    """
+    Genera el menú de una solicitud del lote, capturando sus errores
+    
+    La solicitud se normaliza aquí, así un item mal formado (userId o
+    presupuesto inválidos) solo marca su propio resultado con error.
+    """
+    user_id = solicitud.get('userId') if isinstance(solicitud, dict) else None
+    try:
+        user_id, presupuesto, pref_tipo, pref_cat = normalizar_solicitud(solicitud)
+        if solo_menu:
+            # Lista e info se calculan después para todo el lote a la vez
+            menu = modelo.generar_menu_semanal(
+                presupuesto=presupuesto,
+                preferencias_tipo=pref_tipo,
+                preferencias_categoria=pref_cat
+            )
+            return {'userId': user_id, 'presupuesto': presupuesto, 'menu': menu}
+        
+        menu, lista, info = generar_menu_usuario(
+            modelo, catalogo_ingredientes, presupuesto, pref_tipo, pref_cat
+        )
+        return {
+            'userId': user_id,
+            'presupuesto': presupuesto,
+            'menu': menu,
+            'listaCompras': lista,
+            'infoNutricional': info
+        }
+    except Exception as e:
+        return {'userId': user_id, 'error': str(e)}
+
+def generar_menus_lote(modelo, catalogo_ingredientes, solicitudes, procesos=None, matriz=None):
+    """
+    Genera los menús de muchas solicitudes reutilizando un mismo modelo
+    
+    Args:
+        modelo: MenuMLLite ya entrenado (compartido por fork)
+        catalogo_ingredientes: Fuente de ingredientes en memoria
+        solicitudes: Lista de dicts del lote (userId, presupuesto, tipoComida,
+                     categoria), sin normalizar
+        procesos: Número de procesos (se acota a procesos_disponibles());
+                  por defecto BATCH_PROCESOS o núcleos disponibles
+        matriz: MatrizCompras opcional; con ella las listas de compras y la
+                info nutricional de todo el lote salen de un producto matricial
+        
+    Returns:
+        Lista de resultados en el mismo orden que las solicitudes
+    """
+    # El número de procesos puede venir del cliente: nunca más que los disponibles
+    disponibles = procesos_disponibles()
+    if procesos is None:
+        procesos = os.environ.get('BATCH_PROCESOS', disponibles)
+    procesos = max(1, min(int(procesos), disponibles))
+    
+    # Antes del fork, para que los procesos hereden los costos precalculados
+    modelo.usar_catalogo(catalogo_ingredientes)
+    
+    resultados = map_en_procesos(
+        lambda solicitud: _procesar_solicitud(
+            modelo, catalogo_ingredientes, solicitud, solo_menu=matriz is not None
+        ),
+        solicitudes,
+        procesos
+    )
+    
+    if matriz is not None:
+        correctos = [r for r in resultados if 'error' not in r]
+        menus = [r['menu'] for r in correctos]
+        with instrumentacion.etapa('lista_compras'):
+            listas = matriz.listas_compras(menus)
+        with instrumentacion.etapa('info_nutricional'):
+            infos = matriz.infos_nutricionales(menus)
+        for resultado, lista, info in zip(correctos, listas, infos):
+            resultado['listaCompras'] = lista
+            resultado['infoNutricional'] = info
+    
+    return resultados
+
+def guardar_menus_lote(db, resultados):
+    """
+    Guarda en la base de datos los menús generados correctamente
+    
+    Returns:
+        Número de menús guardados
+    """
+    registros = [
+        (
+            r['userId'],
+            r['presupuesto'],
+            serializacion.dumps(formatear_menu_compacto(r['menu'])),
+            serializacion.dumps(r['listaCompras'])
+        )
+        for r in resultados if 'error' not in r
+    ]
+    return db.save_menus(registros)
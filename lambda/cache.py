@@ -0,0 +1,129 @@
+import os
+import time
+import instrumentacion
+
+class ModeloCache:
+    """
+    Cache a nivel de módulo del catálogo de platos y del modelo entrenado.
+    Sobrevive entre invocaciones mientras Lambda reutilice el contenedor y
+    se invalida cuando cambia la versión del catálogo.
+    
+    La versión es CATALOG_VERSION si está definida; si no, el sello que
+    publica en la base quien carga el catálogo, que se consulta cada vez
+    que vence el TTL. Si el sello no cambió se renueva el TTL sin recargar;
+    sin sello (base antigua) el TTL fuerza la recarga como antes.
+    """
+    
+    def __init__(self, ttl_segundos=None):
+        if ttl_segundos is None:
+            ttl_segundos = float(os.environ.get('MODEL_CACHE_TTL', 300))
+        self.ttl_segundos = ttl_segundos
+        
+        self.platos = None
+        self.modelo = None
+        self.version = None
+        self.cargado_en = 0
+        
+        # Contadores de uso
+        self.hits = 0
+        self.misses = 0
+        self.revalidaciones = 0
+    
+    def _version_actual(self, db):
+        """Versión del catálogo: la del entorno o el sello guardado en la base"""
+        version = os.environ.get('CATALOG_VERSION', '')
+        if version:
+            return version
+        try:
+            return db.get_version_catalogo()
+        except Exception as e:
+            print(f"No se pudo leer la versión del catálogo: {str(e)}")
+            return ''
+    
+    def _vigente(self, db):
+        """
+        Indica si lo cacheado sigue siendo válido
+        
+        Returns:
+            Tuple (vigente, versión actual o None si no hizo falta leerla)
+        """
+        if self.modelo is None:
+            return False, None
+        
+        version_entorno = os.environ.get('CATALOG_VERSION', '')
+        if version_entorno and version_entorno != self.version:
+            return False, version_entorno
+        if (time.monotonic() - self.cargado_en) < self.ttl_segundos:
+            return True, None
+        
+        # Vencido el TTL se revisa el sello; si no cambió se sigue usando
+        version = self._version_actual(db)
+        if version and version == self.version:
+            self.revalidaciones += 1
+            self.cargado_en = time.monotonic()
+            return True, version
+        return False, version
+    
+    def obtener(self, db):
+        """
+        Devuelve (platos, modelo) desde cache o recargando desde la base de datos
+        
+        Args:
+            db: Conexión a la base de datos ya conectada
+            
+        Returns:
+            Tuple con la lista de platos y el modelo entrenado
+        """
+        vigente, version = self._vigente(db)
+        if vigente:
+            self.hits += 1
+            return self.platos, self.modelo
+        
+        if version is None:
+            version = self._version_actual(db)
+        self.misses += 1
+        with instrumentacion.etapa('db_platos'):
+            platos = db.get_all_platos()
+        print(f"Catálogo recargado: {len(platos)} platos (versión '{version}')")
+        
+        # El modelo (y numpy) se importa recién cuando una ruta lo necesita
+        from ml_model import MenuRandomForest
+        
+        # Agregados de feedback por plato (tabla compacta, una fila por plato);
+        # sin ellos el modelo funciona con popularidad neutra
+        with instrumentacion.etapa('db_features'):
+            try:
+                features = db.get_features_platos()
+            except Exception as e:
+                print(f"No se pudieron cargar las features de platos: {str(e)}")
+                features = {}
+        
+        # Crear el modelo con las features precalculadas
+        with instrumentacion.etapa('construccion_modelo'):
+            modelo = MenuRandomForest(platos)
+            modelo.cargar_features(features)
+        
+        self.platos = platos
+        self.modelo = modelo
+        self.version = version
+        self.cargado_en = time.monotonic()
+        
+        return self.platos, self.modelo
+    
+    def invalidar(self):
+        """Fuerza la recarga en la siguiente petición"""
+        self.modelo = None
+        self.platos = None
+    
+    def estadisticas(self):
+        """Devuelve contadores y estado del cache"""
+        edad = time.monotonic() - self.cargado_en if self.modelo is not None else None
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'revalidaciones': self.revalidaciones,
+            'version': self.version,
+            'platos': len(self.platos) if self.platos else 0,
+            'edadSegundos': round(edad, 1) if edad is not None else None,
+            'ttlSegundos': self.ttl_segundos
+        }
@@ -0,0 +1,248 @@
+import os
+import time
+import random
+import sqlite3
+import threading
+import serializacion
+from collections import OrderedDict
+from utils import validar_preferencias
+
+ESQUEMA_COMPARTIDO = """
+CREATE TABLE IF NOT EXISTS menus_cache (
+    clave TEXT,
+    variante INTEGER,
+    creado REAL,
+    datos TEXT,
+    PRIMARY KEY (clave, variante)
+)
+"""
+
+class CacheMenus:
+    """
+    Cache de menús ya generados para combinaciones de parámetros frecuentes
+    
+    La clave es el presupuesto redondeado hacia abajo a un tramo, las
+    preferencias normalizadas con validar_preferencias, el modo, la
+    versión del catálogo de platos y la huella del de ingredientes (sus
+    precios entran en la lista de compras cacheada). Cada clave guarda
+    hasta `variantes` menús: las primeras peticiones los generan y las
+    siguientes reciben uno al azar, sin repetir el último que recibió el
+    mismo usuario para esa clave.
+    
+    Hay un nivel en memoria (LRU por contenedor) y uno compartido opcional
+    en SQLite (MENU_CACHE_COMPARTIDO con la ruta del archivo), que sirve
+    como sustituto local de un cache distribuido.
+    """
+    
+    def __init__(self, activo=None, tramo=None, variantes=None, max_claves=None,
+                 ttl_segundos=None, ruta_compartido=None):
+        if activo is None:
+            activo = os.environ.get('MENU_CACHE', '0') == '1'
+        if tramo is None:
+            tramo = float(os.environ.get('MENU_CACHE_TRAMO', 10))
+        if variantes is None:
+            variantes = int(os.environ.get('MENU_CACHE_VARIANTES', 8))
+        if max_claves is None:
+            max_claves = int(os.environ.get('MENU_CACHE_MAX', 256))
+        if ttl_segundos is None:
+            ttl_segundos = float(os.environ.get('MENU_CACHE_TTL', 600))
+        if ruta_compartido is None:
+            ruta_compartido = os.environ.get('MENU_CACHE_COMPARTIDO')
+        
+        self.activo = activo
+        self.tramo = tramo
+        self.variantes = variantes
+        self.max_claves = max_claves
+        self.ttl_segundos = ttl_segundos
+        self.ruta_compartido = ruta_compartido
+        
+        # clave -> (creado en epoch, lista de variantes)
+        self.entradas = OrderedDict()
+        # (clave, usuario) -> última variante servida (acotado igual que las claves)
+        self.ultima_por_usuario = OrderedDict()
+        self.lock = threading.Lock()
+        self.conexion = None
+        
+        # Contadores de uso
+        self.hits = 0
+        self.hits_compartido = 0
+        self.misses = 0
+        self.errores_compartido = 0
+    
+    def presupuesto_tramo(self, presupuesto):
+        """
+        Presupuesto con el que se generan los menús del tramo
+        
+        Se redondea hacia abajo para que ningún menú servido pase del
+        presupuesto de quien lo pide; por debajo del primer tramo se usa el
+        presupuesto tal cual.
+        """
+        if self.tramo <= 0 or presupuesto < self.tramo:
+            return presupuesto
+        return (presupuesto // self.tramo) * self.tramo
+    
+    def clave(self, presupuesto, preferencias_tipo, preferencias_categoria, modo, version,
+              version_ingredientes=''):
+        """
+        Clave normalizada de una petición
+        
+        Returns:
+            Tuple (clave, presupuesto del tramo, tipos, categorías) con las
+            preferencias ya validadas, que son con las que se genera
+        """
+        tipos, categorias = validar_preferencias(preferencias_tipo, preferencias_categoria)
+        tipos = sorted(set(tipos or []))
+        categorias = sorted(set(categorias or []))
+        presupuesto = self.presupuesto_tramo(presupuesto)
+        
+        clave = '|'.join([
+            f"{presupuesto:g}", ','.join(tipos), ','.join(categorias),
+            modo or 'heuristico', version or '', version_ingredientes or ''
+        ])
+        return clave, presupuesto, tipos, categorias
+    
+    def obtener_o_generar(self, clave, user_id, generar):
+        """
+        Devuelve un menú cacheado para la clave o genera una variante nueva
+        
+        Args:
+            clave: Clave de CacheMenus.clave
+            user_id: Usuario que pide el menú (para no repetirle la variante)
+            generar: Función sin argumentos que corre el pipeline completo
+        
+        Returns:
+            El resultado de `generar` o una variante cacheada equivalente
+        """
+        variantes = self._variantes(clave)
+        
+        if len(variantes) >= self.variantes:
+            self.hits += 1
+            return self._elegir(clave, variantes, user_id)
+        
+        # Aún faltan variantes: esta petición genera una más
+        self.misses += 1
+        resultado = generar()
+        self._agregar(clave, resultado)
+        self._recordar(clave, user_id, len(variantes))
+        return resultado
+    
+    def _variantes(self, clave):
+        """Variantes vigentes de la clave, del nivel en memoria o del compartido"""
+        ahora = time.time()
+        with self.lock:
+            entrada = self.entradas.get(clave)
+            if entrada is not None and ahora - entrada[0] < self.ttl_segundos:
+                self.entradas.move_to_end(clave)
+                return entrada[1]
+        
+        creado, variantes = self._leer_compartido(clave, ahora - self.ttl_segundos)
+        if variantes:
+            self.hits_compartido += 1
+        with self.lock:
+            self._guardar_local(clave, creado or ahora, variantes)
+        return variantes
+    
+    def _elegir(self, clave, variantes, user_id):
+        """Variante al azar distinta de la última que recibió el usuario con esta clave"""
+        with self.lock:
+            ultima = self.ultima_por_usuario.get((clave, user_id))
+        opciones = [i for i in range(len(variantes)) if i != ultima] or [0]
+        indice = random.choice(opciones)
+        self._recordar(clave, user_id, indice)
+        return variantes[indice]
+    
+    def _recordar(self, clave, user_id, indice):
+        with self.lock:
+            self.ultima_por_usuario[(clave, user_id)] = indice
+            self.ultima_por_usuario.move_to_end((clave, user_id))
+            while len(self.ultima_por_usuario) > self.max_claves * self.variantes:
+                self.ultima_por_usuario.popitem(last=False)
+    
+    def _agregar(self, clave, resultado):
+        ahora = time.time()
+        with self.lock:
+            entrada = self.entradas.get(clave)
+            if entrada is None or ahora - entrada[0] >= self.ttl_segundos:
+                entrada = (ahora, [])
+            variantes = entrada[1] + [resultado]
+            self._guardar_local(clave, entrada[0], variantes)
+        self._escribir_compartido(clave, len(variantes) - 1, resultado, entrada[0])
+    
+    def _guardar_local(self, clave, creado, variantes):
+        """Guarda en el LRU (llamar con el lock tomado)"""
+        self.entradas[clave] = (creado, variantes)
+        self.entradas.move_to_end(clave)
+        while len(self.entradas) > self.max_claves:
+            self.entradas.popitem(last=False)
+    
+    def _conexion_compartida(self):
+        if self.conexion is None:
+            self.conexion = sqlite3.connect(self.ruta_compartido, timeout=1, check_same_thread=False)
+            self.conexion.execute(ESQUEMA_COMPARTIDO)
+        return self.conexion
+    
+    def _leer_compartido(self, clave, desde):
+        """
+        Variantes vigentes del nivel compartido
+        
+        Returns:
+            Tuple (creación de la clave o None, lista de variantes); vacía
+            si no hay nivel compartido o falla
+        """
+        if not self.ruta_compartido:
+            return None, []
+        try:
+            with self.lock:
+                rows = self._conexion_compartida().execute(
+                    "SELECT creado, datos FROM menus_cache WHERE clave = ? AND creado >= ? ORDER BY variante",
+                    (clave, desde)
+                ).fetchall()
+        except sqlite3.Error as e:
+            # El cache compartido nunca debe romper la generación
+            self.errores_compartido += 1
+            print(f"Error leyendo el cache compartido de menús: {str(e)}")
+            return None, []
+        if not rows:
+            return None, []
+        return min(row[0] for row in rows), [serializacion.loads(row[1]) for row in rows]
+    
+    def _escribir_compartido(self, clave, variante, resultado, creado):
+        if not self.ruta_compartido:
+            return
+        try:
+            datos = serializacion.dumps(resultado)
+            with self.lock:
+                conexion = self._conexion_compartida()
+                with conexion:
+                    # Las variantes de una generación anterior de la clave ya no sirven
+                    conexion.execute(
+                        "DELETE FROM menus_cache WHERE clave = ? AND creado < ?", (clave, creado)
+                    )
+                    conexion.execute(
+                        "INSERT OR REPLACE INTO menus_cache VALUES (?, ?, ?, ?)",
+                        (clave, variante, creado, datos)
+                    )
+        except sqlite3.Error as e:
+            self.errores_compartido += 1
+            print(f"Error escribiendo el cache compartido de menús: {str(e)}")
+    
+    def invalidar(self):
+        """Vacía el nivel en memoria (el compartido expira por TTL)"""
+        with self.lock:
+            self.entradas.clear()
+            self.ultima_por_usuario.clear()
+    
+    def estadisticas(self):
+        """Devuelve contadores y configuración del cache"""
+        return {
+            'activo': self.activo,
+            'hits': self.hits,
+            'hitsCompartido': self.hits_compartido,
+            'misses': self.misses,
+            'erroresCompartido': self.errores_compartido,
+            'claves': len(self.entradas),
+            'variantesPorClave': self.variantes,
+            'tramo': self.tramo,
+            'ttlSegundos': self.ttl_segundos,
+            'compartido': bool(self.ruta_compartido)
+        }
@@ -0,0 +1,203 @@
+import os
+import json
+import time
+import hashlib
+import instrumentacion
+from decimal import Decimal
+
+RUTA_INGREDIENTES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'ingredientes.json')
+
+class CatalogoIngredientes:
+    """
+    Tabla de ingredientes completa en memoria, cargada una vez por contenedor.
+    Expone la misma interfaz de consulta que KeyspacesConnection, por lo que
+    puede pasarse directamente a calcular_lista_compras.
+    """
+    
+    def __init__(self, ttl_segundos=None, espera_reintento=None):
+        if ttl_segundos is None:
+            ttl_segundos = float(os.environ.get('INGREDIENTES_CACHE_TTL', 900))
+        if espera_reintento is None:
+            espera_reintento = float(os.environ.get('INGREDIENTES_REINTENTO_S', 30))
+        self.ttl_segundos = ttl_segundos
+        self.espera_reintento = espera_reintento
+        
+        self.ingredientes = {}
+        self.origen = None
+        self.cargado_en = None
+        # Huella del contenido: igual en todos los contenedores con los mismos datos
+        self.huella = ''
+        
+        # Último intento de recarga fallido (los datos anteriores siguen en uso)
+        self.fallido_en = None
+        self.recargas_fallidas = 0
+        
+        # Índice entero de ingredientes y líneas precalculadas por plato
+        self.nombres = []
+        self.infos = []
+        self.indice = {}
+        self._lineas_por_plato = {}
+    
+    @classmethod
+    def desde_json(cls, ruta=RUTA_INGREDIENTES):
+        """Crea un catálogo a partir del archivo de datos (fuente offline)"""
+        catalogo = cls(ttl_segundos=float('inf'))
+        catalogo.cargar_json(ruta)
+        return catalogo
+    
+    def cargar_json(self, ruta=RUTA_INGREDIENTES):
+        """Carga los ingredientes desde data/ingredientes.json"""
+        with open(ruta, 'r', encoding='utf-8') as f:
+            datos = json.load(f)
+        
+        ingredientes = {}
+        for nombre, dato in datos.items():
+            ingredientes[nombre] = {
+                'precio': float(dato['precio']),
+                'unidad': dato['unidad'],
+                'venta_por': dato.get('ventaPor', dato['unidad']),
+                'precio_venta': float(dato.get('precioVenta', dato['precio'])),
+                'categoria': dato['categoria']
+            }
+        
+        self._reemplazar(ingredientes, 'json')
+    
+    def cargar_db(self, db):
+        """Carga la tabla completa de ingredientes desde la base de datos"""
+        with instrumentacion.etapa('db_ingredientes'):
+            ingredientes = db.get_all_ingredientes()
+        self._reemplazar(ingredientes, 'db')
+    
+    def _reemplazar(self, ingredientes, origen):
+        self.ingredientes = ingredientes
+        self.origen = origen
+        self.cargado_en = time.monotonic()
+        self.huella = hashlib.sha1(
+            repr(sorted((nombre, sorted(info.items())) for nombre, info in ingredientes.items())).encode()
+        ).hexdigest()[:12]
+        
+        self.nombres = list(ingredientes)
+        self.infos = [ingredientes[nombre] for nombre in self.nombres]
+        self.indice = {nombre: i for i, nombre in enumerate(self.nombres)}
+        # Las conversiones dependen de las unidades de esta carga
+        self._lineas_por_plato = {}
+        print(f"Catálogo de ingredientes cargado: {len(ingredientes)} ingredientes ({origen})")
+    
+    def vigente(self):
+        """
+        Indica si el catálogo está cargado y dentro del TTL
+        
+        Tras una recarga fallida los datos anteriores siguen vigentes
+        durante espera_reintento segundos, para no consultar la base en
+        cada petición mientras falla.
+        """
+        if self.cargado_en is None:
+            return False
+        ahora = time.monotonic()
+        if self.fallido_en is not None and ahora - self.fallido_en < self.espera_reintento:
+            return True
+        return (ahora - self.cargado_en) < self.ttl_segundos
+    
+    def asegurar_vigente(self, db):
+        """
+        Recarga el catálogo desde la base de datos si expiró el TTL
+        
+        Args:
+            db: Conexión a la base de datos ya conectada
+            
+        Returns:
+            El propio catálogo, listo para consultas
+        """
+        if not self.vigente():
+            try:
+                self.cargar_db(db)
+                self.fallido_en = None
+            except Exception as e:
+                # Mantener los datos anteriores si la recarga falla
+                if not self.ingredientes:
+                    raise
+                # cargado_en identifica los datos (ver CostosCompras.vigente),
+                # así que el intento se registra aparte
+                self.fallido_en = time.monotonic()
+                self.recargas_fallidas += 1
+                print(f"Error recargando ingredientes, se usan los datos anteriores "
+                      f"(reintento en {self.espera_reintento:g} s): {e}")
+        return self
+    
+    def lineas_plato(self, plato):
+        """
+        Ingredientes de un plato parseados una sola vez por carga del catálogo
+        
+        Args:
+            plato: Dict del plato con 'ingredientes' como JSON string
+            
+        Returns:
+            Tupla de (índice de ingrediente, cantidad en unidades de compra
+            para 2 personas); se omiten los ingredientes desconocidos
+        """
+        texto = plato['ingredientes']
+        cacheado = self._lineas_por_plato.get(plato['id'])
+        if cacheado is not None and cacheado[0] == texto:
+            return cacheado[1]
+        
+        lineas = self._parsear_lineas(plato)
+        self._lineas_por_plato[plato['id']] = (texto, lineas)
+        return lineas
+    
+    def _parsear_lineas(self, plato):
+        """Parsea el JSON de ingredientes y convierte a la unidad de compra"""
+        lineas = []
+        try:
+            for ing in json.loads(plato['ingredientes']):
+                indice = self.indice.get(ing['ingrediente'])
+                cantidad = float(ing['cantidad'])
+                unidad = ing['unidad']
+                if indice is None:
+                    continue
+                
+                # Multiplicar por 2 (para 2 personas)
+                cantidad_total = cantidad * 2
+                
+                # Convertir unidades si es necesario
+                unidad_compra = self.infos[indice]['unidad']
+                if unidad == 'g' and unidad_compra == 'kg':
+                    cantidad_total = cantidad_total / 1000
+                elif unidad == 'ml' and unidad_compra == 'litro':
+                    cantidad_total = cantidad_total / 1000
+                
+                lineas.append((indice, cantidad_total))
+        
+        except (json.JSONDecodeError, KeyError) as e:
+            print(f"Error procesando ingredientes de {plato.get('nombre', 'desconocido')}: {e}")
+        
+        return tuple(lineas)
+    
+    def get_ingrediente_info(self, nombre):
+        """Obtiene información completa de un ingrediente"""
+        return self.ingredientes.get(nombre)
+    
+    def get_ingredientes_info(self, nombres):
+        """Obtiene la información de varios ingredientes"""
+        ingredientes = self.ingredientes
+        return {nombre: ingredientes[nombre] for nombre in set(nombres) if nombre in ingredientes}
+    
+    def get_ingrediente_precio(self, nombre):
+        """Obtiene el precio de un ingrediente"""
+        info = self.ingredientes.get(nombre)
+        return Decimal(str(info['precio'])) if info else Decimal('5.0')
+    
+    def get_ingrediente_categoria(self, nombre):
+        """Obtiene la categoría de un ingrediente"""
+        info = self.ingredientes.get(nombre)
+        return info['categoria'] if info else 'otros'
+    
+    def estadisticas(self):
+        """Devuelve el estado del catálogo"""
+        return {
+            'ingredientes': len(self.ingredientes),
+            'origen': self.origen,
+            'huella': self.huella,
+            'platosPreparados': len(self._lineas_por_plato),
+            'recargasFallidas': self.recargas_fallidas,
+            'ttlSegundos': self.ttl_segundos
+        }
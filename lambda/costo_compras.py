@@ -0,0 +1,159 @@
+from utils import calcular_compra
+
+# numpy es opcional: sin él el costo marginal se calcula plato por plato
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+class CostosCompras:
+    """
+    Costo real de compra de cada plato del catálogo
+    
+    La regla de calcular_compra es afín en la cantidad: un ingrediente que
+    se vende por presentación (bolsa, atado o con precio de venta) se paga
+    una sola vez en la semana, y el resto se paga por unidad. Por eso el
+    costo de agregar un plato a la semana es su costo aislado menos las
+    presentaciones que ya se están comprando, y se precalcula una vez por
+    carga del catálogo.
+    """
+    
+    def __init__(self, platos, catalogo):
+        self.catalogo = catalogo
+        self.cargado_en = catalogo.cargado_en
+        self.posicion_por_id = {p['id']: i for i, p in enumerate(platos)}
+        
+        # Parte fija (se paga al comprar el ingrediente) y parte por unidad
+        self.fijo = []
+        self.por_unidad = []
+        for info in catalogo.infos:
+            _, fijo = calcular_compra(0, info['precio'], info.get('venta_por'), info.get('precio_venta'))
+            _, uno = calcular_compra(1, info['precio'], info.get('venta_por'), info.get('precio_venta'))
+            self.fijo.append(fijo)
+            self.por_unidad.append(uno - fijo)
+        
+        # Por plato: costo comprando todo desde cero e ingredientes con parte fija
+        self.aislado = []
+        self.ingredientes_fijos = []
+        platos_por_ingrediente = [[] for _ in self.fijo]
+        for posicion, plato in enumerate(platos):
+            lineas = catalogo.lineas_plato(plato)
+            fijos = tuple({indice for indice, _ in lineas if self.fijo[indice]})
+            self.aislado.append(
+                sum(self.fijo[indice] for indice in fijos)
+                + sum(self.por_unidad[indice] * cantidad for indice, cantidad in lineas)
+            )
+            self.ingredientes_fijos.append(fijos)
+            for indice in fijos:
+                platos_por_ingrediente[indice].append(posicion)
+        
+        # Costo de servir otra vez un plato ya comprado esa semana: solo la parte por unidad
+        self.repeticion = [
+            aislado - sum(self.fijo[indice] for indice in fijos)
+            for aislado, fijos in zip(self.aislado, self.ingredientes_fijos)
+        ]
+        
+        # Índice invertido: al comprar un ingrediente solo se actualizan sus platos
+        if np is not None:
+            self.aislado = np.array(self.aislado, dtype=np.float64)
+            self.repeticion = np.array(self.repeticion, dtype=np.float64)
+            platos_por_ingrediente = [np.array(p, dtype=np.int64) for p in platos_por_ingrediente]
+        self.platos_por_ingrediente = platos_por_ingrediente
+    
+    def vigente(self, catalogo):
+        """Indica si los costos corresponden a la carga actual del catálogo"""
+        return catalogo is self.catalogo and catalogo.cargado_en == self.cargado_en
+    
+    def nuevo_carrito(self):
+        """Carrito vacío para armar una semana"""
+        return CarritoCompras(self)
+
+class CarritoCompras:
+    """
+    Ingredientes que ya se compran en la semana que se está armando
+    
+    Mantiene el costo marginal de todos los platos y lo actualiza al
+    comprar cada ingrediente nuevo, así consultar el de los candidatos de
+    un slot no requiere recalcular la lista de compras.
+    """
+    
+    def __init__(self, costos):
+        self.costos = costos
+        self.comprados = set()
+        self.marginales_platos = costos.aislado.copy()
+        
+        # Gasto real acumulado y presupuesto asignado a los slots ya vistos
+        self.gastado = 0.0
+        self.asignado = 0.0
+    
+    def marginal(self, plato):
+        """Costo de agregar un plato a la semana"""
+        return float(self.marginales_platos[self.costos.posicion_por_id[plato['id']]])
+    
+    def marginales(self, candidatos):
+        """
+        Costo marginal de todos los candidatos de un slot
+        
+        Returns:
+            Array numpy si está disponible, si no una lista
+        """
+        posicion_por_id = self.costos.posicion_por_id
+        if np is None:
+            return [self.marginales_platos[posicion_por_id[p['id']]] for p in candidatos]
+        
+        posiciones = np.fromiter(
+            (posicion_por_id[p['id']] for p in candidatos), dtype=np.int64, count=len(candidatos)
+        )
+        return self.marginales_platos[posiciones]
+    
+    def filtrar(self, candidatos, limite):
+        """
+        Deja los candidatos cuyo costo marginal entra en el límite del slot
+        
+        Si ninguno entra, queda al menos el de menor costo marginal.
+        
+        Returns:
+            Tuple (candidatos, costos marginales, presupuesto para el scoring)
+        """
+        costos = self.marginales(candidatos)
+        
+        if np is None:
+            presupuesto_max = max(limite, min(costos), 0.01)
+            dentro = [i for i, costo in enumerate(costos) if costo <= presupuesto_max]
+            if len(dentro) < len(candidatos):
+                candidatos = [candidatos[i] for i in dentro]
+                costos = [costos[i] for i in dentro]
+            return candidatos, costos, presupuesto_max
+        
+        presupuesto_max = max(limite, float(costos.min()), 0.01)
+        dentro = costos <= presupuesto_max
+        if not dentro.all():
+            candidatos = [candidatos[i] for i in np.flatnonzero(dentro)]
+            costos = costos[dentro]
+        return candidatos, costos, presupuesto_max
+    
+    def limite(self, presupuesto_slot):
+        """
+        Presupuesto disponible para un slot
+        
+        Lo que no se gastó en los slots anteriores (o lo que se gastó de más
+        al comprar ingredientes que se reutilizan) pasa al siguiente.
+        """
+        self.asignado += presupuesto_slot
+        return self.asignado - self.gastado
+    
+    def agregar(self, plato):
+        """Registra un plato elegido y descuenta sus ingredientes del resto"""
+        self.gastado += self.marginal(plato)
+        
+        fijo = self.costos.fijo
+        for indice in self.costos.ingredientes_fijos[self.costos.posicion_por_id[plato['id']]]:
+            if indice in self.comprados:
+                continue
+            self.comprados.add(indice)
+            platos = self.costos.platos_por_ingrediente[indice]
+            if np is None:
+                for posicion in platos:
+                    self.marginales_platos[posicion] -= fijo[indice]
+            else:
+                self.marginales_platos[platos] -= fijo[indice]
@@ -1,21 +1,136 @@
 import ssl
 import os
-from cassandra.cluster import Cluster
-from cassandra.auth import PlainTextAuthProvider
-from cassandra.policies import DCAwareRoundRobinPolicy
-from cassandra import ConsistencyLevel
-from datetime import datetime
-import json
+import time
+import base64
+from datetime import datetime, timedelta
+import serializacion
 from decimal import Decimal
+from almacenamiento import Almacenamiento, HISTORIAL_POR_PAGINA, HISTORIAL_MAX_POR_PAGINA
+from escritura_diferida import EscrituraDiferida
 
-class KeyspacesConnection:
+# Consultas preparadas una sola vez y reutilizadas durante la vida del contenedor
+CONSULTAS = {
+    'ingrediente_precio': "SELECT precio FROM ingredientes WHERE nombre = ?",
+    'ingrediente_info': "SELECT * FROM ingredientes WHERE nombre = ?",
+    'ingrediente_categoria': "SELECT categoria FROM ingredientes WHERE nombre = ?",
+    'guardar_menu': """
+        INSERT INTO menus_generados 
+        (user_id, fecha_generacion, presupuesto, menu_json, lista_compras)
+        VALUES (?, ?, ?, ?, ?)
+        """,
+    'menus_usuario': """
+        SELECT fecha_generacion, presupuesto, menu_json, lista_compras 
+        FROM menus_generados 
+        WHERE user_id = ? 
+        """,
+    'menus_usuario_resumen': """
+        SELECT fecha_generacion, presupuesto 
+        FROM menus_generados 
+        WHERE user_id = ? 
+        """,
+    'menu_usuario': """
+        SELECT fecha_generacion, presupuesto, menu_json, lista_compras 
+        FROM menus_generados 
+        WHERE user_id = ? AND fecha_generacion = ?
+        """,
+    # Tabla de contadores con los agregados de feedback por plato:
+    # CREATE TABLE features_platos (plato_id int PRIMARY KEY,
+    #     selecciones counter, suma_satisfaccion counter, valoraciones counter)
+    'features_platos': """
+        SELECT plato_id, selecciones, suma_satisfaccion, valoraciones 
+        FROM features_platos
+        """,
+    'sumar_feedback_plato': """
+        UPDATE features_platos 
+        SET selecciones = selecciones + ?, 
+            suma_satisfaccion = suma_satisfaccion + ?, 
+            valoraciones = valoraciones + ? 
+        WHERE plato_id = ?
+        """,
+    # Menús que ya recibieron feedback (uno por menú):
+    # CREATE TABLE feedback_menus (user_id uuid, fecha_generacion timestamp,
+    #     fecha_feedback timestamp, PRIMARY KEY (user_id, fecha_generacion))
+    'marcar_feedback': """
+        INSERT INTO feedback_menus (user_id, fecha_generacion, fecha_feedback)
+        VALUES (?, ?, ?) IF NOT EXISTS
+        """,
+    'desmarcar_feedback': """
+        DELETE FROM feedback_menus WHERE user_id = ? AND fecha_generacion = ?
+        """,
+    # Sello de versión del catálogo que publica quien carga platos e ingredientes:
+    # CREATE TABLE catalogo_metadata (clave text PRIMARY KEY, valor text)
+    'metadata_catalogo': "SELECT valor FROM catalogo_metadata WHERE clave = ?"
+}
+
+# Ajustes del driver (tiempos en segundos)
+TIMEOUT_CONSULTA = float(os.environ.get('KEYSPACES_TIMEOUT', 5))
+TIMEOUT_CONEXION = float(os.environ.get('KEYSPACES_CONNECT_TIMEOUT', 5))
+TIMEOUT_PING = float(os.environ.get('KEYSPACES_TIMEOUT_PING', 1))
+
+# Hilos del driver para callbacks y tareas asíncronas (escrituras diferidas)
+HILOS_DRIVER = int(os.environ.get('KEYSPACES_HILOS', 2))
+
+# Ejecución especulativa de lecturas idempotentes: si no hay respuesta en
+# ESPECULATIVA_MS se lanza la misma consulta contra otro nodo (0 la desactiva)
+ESPECULATIVA_MS = float(os.environ.get('KEYSPACES_ESPECULATIVA_MS', 150))
+ESPECULATIVA_INTENTOS = int(os.environ.get('KEYSPACES_ESPECULATIVA_INTENTOS', 2))
+
+# Consultas que no se pueden repetir sin cambiar el resultado: incrementos de
+# counter y transacciones ligeras (repetir un IF NOT EXISTS que ya se aplicó
+# devuelve was_applied=False). El resto se marcan idempotentes y solo esas se
+# reintentan o se ejecutan de forma especulativa; las escrituras normales llevan
+# la clave completa (fecha_generacion incluida) y repetirlas no duplica filas
+CONSULTAS_NO_IDEMPOTENTES = {'sumar_feedback_plato', 'marcar_feedback'}
+
+# Segundos sin uso tras los que se verifica la sesión antes de reutilizarla
+# (un contenedor congelado puede quedar con conexiones cerradas por el servidor)
+MAX_INACTIVIDAD = float(os.environ.get('KEYSPACES_MAX_INACTIVIDAD', 60))
+
+def _metricas_disponibles():
+    """Las métricas del driver requieren la librería scales"""
+    if os.environ.get('KEYSPACES_METRICAS', '1') != '1':
+        return False
+    try:
+        from greplin import scales  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+class KeyspacesConnection(Almacenamiento):
     def __init__(self):
-        self.session = None
+        super().__init__()
         self.cluster = None
         
-    def connect(self):
-        """Conecta a Amazon Keyspaces"""
+        # Salud de la sesión
+        self.ultimo_uso = 0.0
+        self.reconexiones = 0
+        
+        # Registro de sentencias preparadas
+        self.prepared = {}
+        self.prepare_count = 0
+        
+        # Inserciones de menús fuera del camino de la respuesta
+        self.escrituras = EscrituraDiferida()
+        
+    def connect(self, preparar_consultas=False):
+        """
+        Conecta a Amazon Keyspaces
+        
+        Args:
+            preparar_consultas: Si es True prepara todas las CONSULTAS al conectar
+                                en lugar de hacerlo en el primer uso
+        """
         print("Conectando a Amazon Keyspaces...")
+        inicio = time.perf_counter()
+        
+        # El driver se importa recién al conectar para no pagarlo en rutas que no lo usan
+        from cassandra.cluster import Cluster, ExecutionProfile, EXEC_PROFILE_DEFAULT
+        from cassandra.auth import PlainTextAuthProvider
+        from cassandra.policies import DCAwareRoundRobinPolicy, ConstantSpeculativeExecutionPolicy
+        from cassandra import ConsistencyLevel
+        # La importación se informa aparte: conexionMs es solo el handshake
+        self.tiempos['importMs'] = round((time.perf_counter() - inicio) * 1000, 1)
+        inicio = time.perf_counter()
         
         # Configurar SSL
         ssl_context = ssl.SSLContext(ssl.PROTOCOL_TLSv1_2)
@@ -30,34 +145,241 @@ class KeyspacesConnection:
         
         # AWS_REGION es una variable automática en Lambda
         region = os.environ.get('AWS_REGION', 'us-east-1')
+        
+        # IMPORTANTE: Keyspaces requiere LOCAL_QUORUM; la especulación solo
+        # se aplica a sentencias marcadas como idempotentes
+        especulativa = None
+        if ESPECULATIVA_MS > 0:
+            especulativa = ConstantSpeculativeExecutionPolicy(
+                ESPECULATIVA_MS / 1000, ESPECULATIVA_INTENTOS
+            )
+        perfil = ExecutionProfile(
+            load_balancing_policy=DCAwareRoundRobinPolicy(local_dc=region),
+            consistency_level=ConsistencyLevel.LOCAL_QUORUM,
+            request_timeout=TIMEOUT_CONSULTA,
+            speculative_execution_policy=especulativa
+        )
+        
+        # Con protocol_version 4 el driver usa una conexión multiplexada por
+        # nodo; el tamaño de pool por host solo es configurable en v1/v2
         self.cluster = Cluster(
             [f"cassandra.{region}.amazonaws.com"],
             port=9142,
             auth_provider=auth_provider,
             ssl_context=ssl_context,
             protocol_version=4,
-            load_balancing_policy=DCAwareRoundRobinPolicy(local_dc=region)
+            execution_profiles={EXEC_PROFILE_DEFAULT: perfil},
+            connect_timeout=TIMEOUT_CONEXION,
+            executor_threads=HILOS_DRIVER,
+            metrics_enabled=_metricas_disponibles()
         )
         
         # Conectar al keyspace
         self.session = self.cluster.connect('menu_semanal')
+        self.ultimo_uso = time.monotonic()
         
-        # IMPORTANTE: Configurar consistencia para Keyspaces
-        self.session.default_consistency_level = ConsistencyLevel.LOCAL_QUORUM
+        # Las sentencias preparadas pertenecen a la sesión anterior
+        self.prepared = {}
+        if preparar_consultas:
+            for nombre in CONSULTAS:
+                self._statement(nombre)
         
-        print("Conexión exitosa a Keyspaces")
+        self.tiempos['conexionMs'] = round((time.perf_counter() - inicio) * 1000, 1)
+        print(f"Conexión exitosa a Keyspaces ({self.tiempos['conexionMs']} ms)")
         return self.session
     
+    def _statement(self, nombre):
+        """Devuelve la sentencia preparada `nombre`, preparándola en el primer uso"""
+        prepared = self.prepared.get(nombre)
+        if prepared is None:
+            from cassandra import ConsistencyLevel
+            prepared = self.session.prepare(CONSULTAS[nombre])
+            prepared.consistency_level = ConsistencyLevel.LOCAL_QUORUM
+            prepared.is_idempotent = nombre not in CONSULTAS_NO_IDEMPOTENTES
+            self.prepared[nombre] = prepared
+            self.prepare_count += 1
+        return prepared
+    
+    def estadisticas_consultas(self):
+        """Devuelve métricas del registro de sentencias preparadas"""
+        return {
+            'preparadas': sorted(self.prepared),
+            'prepareCount': self.prepare_count
+        }
+    
+    def estadisticas_conexion(self):
+        """Devuelve métricas del driver (cluster.metrics) y de reconexión"""
+        estadisticas = {'reconexiones': self.reconexiones}
+        metricas = self.cluster.metrics if self.cluster else None
+        if metricas is None:
+            return estadisticas
+        
+        stats = metricas.get_stats()
+        timer = stats['request_timer']
+        estadisticas.update({
+            'peticiones': timer.get('count', 0),
+            'latenciaMediaMs': round(timer.get('mean', 0) * 1000, 2),
+            'latenciaP99Ms': round(timer.get('99percentile', 0) * 1000, 2),
+            'erroresConexion': stats['connection_errors'],
+            'timeoutsLectura': stats['read_timeouts'],
+            'timeoutsEscritura': stats['write_timeouts'],
+            'reintentos': stats['retries'],
+            'otrosErrores': stats['other_errors'],
+            # Los gauges de conexiones son funciones evaluadas al leerlas
+            'conexionesAbiertas': stats['open_connections']()
+        })
+        return estadisticas
+    
+    def asegurar_sesion(self):
+        """
+        Devuelve una sesión utilizable, conectando o reconectando si hace falta
+        
+        Si la sesión lleva más de MAX_INACTIVIDAD segundos sin usarse se
+        verifica con una consulta barata antes de confiar en ella.
+        """
+        if self.session is None:
+            return self.connect()
+        
+        inactiva = time.monotonic() - self.ultimo_uso
+        if MAX_INACTIVIDAD > 0 and inactiva > MAX_INACTIVIDAD and not self._sesion_sana():
+            return self.reconectar()
+        return self.session
+    
+    def _sesion_sana(self):
+        """Consulta mínima con timeout corto para detectar conexiones muertas"""
+        try:
+            self.session.execute("SELECT release_version FROM system.local", timeout=TIMEOUT_PING)
+        except Exception as e:
+            print(f"Sesión de Keyspaces no responde: {str(e)}")
+            return False
+        self.ultimo_uso = time.monotonic()
+        return True
+    
+    def reconectar(self):
+        """
+        Descarta el cluster actual y abre una conexión nueva
+        
+        Las escrituras diferidas en vuelo tienen TIMEOUT_PING segundos para
+        terminar; las que sigan pendientes se pierden al cerrar y se informan.
+        """
+        print("Reconectando a Keyspaces...")
+        self.reconexiones += 1
+        if not self.escrituras.flush(TIMEOUT_PING):
+            print(f"Escrituras diferidas perdidas al reconectar: {self.escrituras.estadisticas()}")
+        try:
+            self.close()
+        except Exception as e:
+            print(f"Error cerrando la conexión anterior: {str(e)}")
+        self.cluster = None
+        self.session = None
+        return self.connect()
+    
+    def _ejecutar(self, consulta, parametros=None, fetch_size=None, **kwargs):
+        """
+        Ejecuta una consulta y, ante un fallo de conexión, reconecta y la
+        reintenta una vez si es idempotente
+        
+        Las consultas no idempotentes (counters, IF NOT EXISTS) pueden haberse
+        aplicado aunque no llegara la respuesta, así que se reconecta para las
+        siguientes pero el error se propaga sin repetirlas (is_idempotent de
+        la sentencia preparada). El CQL sin preparar solo se usa para
+        lecturas y se reintenta.
+        
+        Args:
+            consulta: Nombre en CONSULTAS (se usa la sentencia preparada) o CQL
+            parametros: Valores de la consulta
+            fetch_size: Tamaño de página (solo para consultas preparadas)
+            **kwargs: Argumentos extra de session.execute (paging_state, ...)
+        """
+        from cassandra import OperationTimedOut
+        from cassandra.cluster import NoHostAvailable
+        
+        for intento in range(2):
+            statement = consulta
+            valores = parametros
+            if consulta in CONSULTAS:
+                # Se resuelve en cada intento: tras reconectar hay que volver a preparar
+                statement = self._statement(consulta)
+                if fetch_size:
+                    statement = statement.bind(parametros)
+                    statement.fetch_size = fetch_size
+                    valores = None
+            try:
+                resultado = self.session.execute(statement, valores, **kwargs)
+            except (NoHostAvailable, OperationTimedOut) as e:
+                if intento:
+                    raise
+                print(f"Fallo de conexión con Keyspaces: {str(e)}")
+                self.reconectar()
+                # El CQL sin preparar es un str, no lleva la marca
+                if not getattr(statement, 'is_idempotent', True):
+                    raise
+                continue
+            self.ultimo_uso = time.monotonic()
+            return resultado
+    
+    def _ejecutar_concurrente(self, consulta, parametros, concurrencia=50):
+        """
+        Ejecuta una consulta preparada con muchos juegos de parámetros
+        
+        Como _ejecutar: si algunas fallan por la conexión, reconecta una vez
+        y, si la consulta es idempotente, reintenta solo esas.
+        
+        Args:
+            consulta: Nombre en CONSULTAS
+            parametros: Lista de juegos de valores
+            concurrencia: Máximo de consultas en vuelo simultáneamente
+            
+        Returns:
+            Lista de (success, resultado o excepción) en el orden de parametros
+        """
+        from cassandra import OperationTimedOut
+        from cassandra.cluster import NoHostAvailable
+        from cassandra.concurrent import execute_concurrent_with_args
+        
+        resultados = [None] * len(parametros)
+        pendientes = list(range(len(parametros)))
+        for intento in range(2):
+            ejecutados = execute_concurrent_with_args(
+                self.session,
+                self._statement(consulta),
+                [parametros[i] for i in pendientes],
+                concurrency=concurrencia,
+                raise_on_first_error=False
+            )
+            fallidas = []
+            for i, (success, result) in zip(pendientes, ejecutados):
+                resultados[i] = (success, result)
+                if not success and isinstance(result, (NoHostAvailable, OperationTimedOut)):
+                    fallidas.append(i)
+            if not fallidas or intento:
+                break
+            print(f"Fallo de conexión con Keyspaces en {len(fallidas)} consultas")
+            self.reconectar()
+            if not self._statement(consulta).is_idempotent:
+                break
+            pendientes = fallidas
+        
+        self.ultimo_uso = time.monotonic()
+        return resultados
+    
     def close(self):
         """Cierra la conexión"""
         if self.cluster:
             self.cluster.shutdown()
+            self.cluster = None
+            self.session = None
             print("Conexión cerrada")
     
+    def get_version_catalogo(self):
+        """Sello de versión del catálogo ('' si no se publicó ninguno)"""
+        row = self._ejecutar('metadata_catalogo', ['version']).one()
+        return row.valor if row and row.valor else ''
+    
     def get_all_platos(self):
         """Obtiene todos los platos de la base de datos"""
         query = "SELECT * FROM platos"
-        rows = self.session.execute(query)
+        rows = self._ejecutar(query)
         
         platos = []
         for row in rows:
@@ -76,22 +398,31 @@ class KeyspacesConnection:
         
         return platos
     
+    def get_all_ingredientes(self):
+        """Obtiene la tabla completa de ingredientes indexada por nombre"""
+        query = "SELECT * FROM ingredientes"
+        rows = self._ejecutar(query)
+        
+        ingredientes = {}
+        for row in rows:
+            ingredientes[row.nombre] = {
+                'precio': float(row.precio),
+                'unidad': row.unidad,
+                'venta_por': row.venta_por,
+                'precio_venta': float(row.precio_venta) if row.precio_venta else float(row.precio),
+                'categoria': row.categoria
+            }
+        
+        return ingredientes
+    
     def get_ingrediente_precio(self, nombre):
         """Obtiene el precio de un ingrediente"""
-        query = "SELECT precio FROM ingredientes WHERE nombre = ?"
-        prepared = self.session.prepare(query)
-        prepared.consistency_level = ConsistencyLevel.LOCAL_QUORUM
-        
-        row = self.session.execute(prepared, [nombre]).one()
+        row = self._ejecutar('ingrediente_precio', [nombre]).one()
         return Decimal(str(row.precio)) if row else Decimal('5.0')
     
     def get_ingrediente_info(self, nombre):
         """Obtiene información completa de un ingrediente"""
-        query = "SELECT * FROM ingredientes WHERE nombre = ?"
-        prepared = self.session.prepare(query)
-        prepared.consistency_level = ConsistencyLevel.LOCAL_QUORUM
-        
-        row = self.session.execute(prepared, [nombre]).one()
+        row = self._ejecutar('ingrediente_info', [nombre]).one()
         if row:
             return {
                 'precio': float(row.precio),
@@ -102,27 +433,51 @@ class KeyspacesConnection:
             }
         return None
     
+    def get_ingredientes_info(self, nombres, concurrencia=50):
+        """
+        Obtiene la información de varios ingredientes en una sola pasada
+        
+        Args:
+            nombres: Iterable de nombres de ingredientes (puede tener repetidos)
+            concurrencia: Máximo de consultas en vuelo simultáneamente
+            
+        Returns:
+            Dict nombre -> info (mismo formato que get_ingrediente_info);
+            los ingredientes inexistentes no aparecen en el dict
+        """
+        nombres_unicos = list(dict.fromkeys(nombres))
+        if not nombres_unicos:
+            return {}
+        
+        resultados = self._ejecutar_concurrente(
+            'ingrediente_info', [(nombre,) for nombre in nombres_unicos], concurrencia
+        )
+        
+        infos = {}
+        for nombre, (success, result) in zip(nombres_unicos, resultados):
+            if not success:
+                print(f"Error obteniendo ingrediente {nombre}: {result}")
+                continue
+            row = result.one()
+            if row:
+                infos[nombre] = {
+                    'precio': float(row.precio),
+                    'unidad': row.unidad,
+                    'venta_por': row.venta_por,
+                    'precio_venta': float(row.precio_venta) if row.precio_venta else float(row.precio),
+                    'categoria': row.categoria
+                }
+        
+        return infos
+    
     def get_ingrediente_categoria(self, nombre):
         """Obtiene la categoría de un ingrediente"""
-        query = "SELECT categoria FROM ingredientes WHERE nombre = ?"
-        prepared = self.session.prepare(query)
-        prepared.consistency_level = ConsistencyLevel.LOCAL_QUORUM
-        
-        row = self.session.execute(prepared, [nombre]).one()
+        row = self._ejecutar('ingrediente_categoria', [nombre]).one()
         return row.categoria if row else 'otros'
     
     def save_menu(self, user_id, presupuesto, menu_json, lista_json):
         """Guarda un menú generado"""
-        query = """
-        INSERT INTO menus_generados 
-        (user_id, fecha_generacion, presupuesto, menu_json, lista_compras)
-        VALUES (?, ?, ?, ?, ?)
-        """
-        
-        prepared = self.session.prepare(query)
-        prepared.consistency_level = ConsistencyLevel.LOCAL_QUORUM
-        
-        self.session.execute(prepared, [
+        self._ejecutar('guardar_menu', [
             user_id, 
             datetime.now(), 
             presupuesto, 
@@ -132,30 +487,183 @@ class KeyspacesConnection:
         
         print(f"Menú guardado para usuario {user_id}")
     
-    def get_user_menus(self, user_id):
-        """Obtiene los menús de un usuario"""
-        query = """
-        SELECT fecha_generacion, presupuesto, menu_json, lista_compras 
-        FROM menus_generados 
-        WHERE user_id = ? 
-        LIMIT 10
+    def save_menu_async(self, user_id, presupuesto, menu_json, lista_json):
+        """Encola el guardado de un menú con execute_async (write-behind)"""
+        self.escrituras.enviar(self._destino('guardar_menu'), [
+            user_id,
+            datetime.now(),
+            presupuesto,
+            menu_json,
+            lista_json
+        ])
+    
+    def _destino(self, consulta):
+        """Sesión y sentencia actuales (tras reconectar cambian ambas)"""
+        return lambda: (self.session, self._statement(consulta))
+    
+    def flush_escrituras(self, timeout=None):
+        """Espera a que terminen los guardados diferidos"""
+        return self.escrituras.flush(timeout)
+    
+    def estadisticas_escrituras(self):
+        """Contadores de los guardados diferidos"""
+        return self.escrituras.estadisticas()
+    
+    def save_menus(self, registros, concurrencia=50):
         """
+        Guarda muchos menús con inserciones concurrentes
+        
+        Args:
+            registros: Lista de (user_id, presupuesto, menu_json, lista_json)
+            concurrencia: Máximo de inserciones en vuelo simultáneamente
+            
+        Returns:
+            Número de menús guardados correctamente
+        """
+        if not registros:
+            return 0
+        
+        # fecha_generacion es clustering key con precisión de milisegundos:
+        # separar cada fila 1 ms para que los menús de un mismo usuario no se pisen.
+        # Con la clave fija, reintentar una inserción no duplica el menú
+        fecha = datetime.now()
+        resultados = self._ejecutar_concurrente(
+            'guardar_menu',
+            [(user_id, fecha + timedelta(milliseconds=i), presupuesto, menu_json, lista_json)
+             for i, (user_id, presupuesto, menu_json, lista_json) in enumerate(registros)],
+            concurrencia
+        )
         
-        prepared = self.session.prepare(query)
-        prepared.consistency_level = ConsistencyLevel.LOCAL_QUORUM
+        guardados = 0
+        for (user_id, _, _, _), (success, result) in zip(registros, resultados):
+            if success:
+                guardados += 1
+            else:
+                print(f"Error guardando menú de {user_id}: {result}")
+        
+        print(f"Menús guardados en lote: {guardados}/{len(registros)}")
+        return guardados
+    
+    def _fila_menu(self, row):
+        """Convierte una fila completa de menus_generados en dict"""
+        return self._menu_desde_blobs(
+            row.fecha_generacion, row.presupuesto, row.menu_json, row.lista_compras
+        )
+    
+    def get_user_menus_pagina(self, user_id, limite=HISTORIAL_POR_PAGINA, pagina=None, resumen=False):
+        """
+        Obtiene una página del historial de menús de un usuario
+        
+        Args:
+            user_id: ID del usuario
+            limite: Menús por página (máximo HISTORIAL_MAX_POR_PAGINA)
+            pagina: Token devuelto por la página anterior (None para la primera)
+            resumen: Si es True solo lee fecha y presupuesto, sin los blobs JSON
+            
+        Returns:
+            Dict con 'menus' y 'siguientePagina' (None si no hay más)
+        """
+        limite = max(1, min(int(limite), HISTORIAL_MAX_POR_PAGINA))
+        
+        paging_state = base64.urlsafe_b64decode(pagina) if pagina else None
+        rows = self._ejecutar(
+            'menus_usuario_resumen' if resumen else 'menus_usuario',
+            [user_id],
+            fetch_size=limite,
+            paging_state=paging_state
+        )
         
-        rows = self.session.execute(prepared, [user_id])
         menus = []
+        for row in rows.current_rows:
+            if resumen:
+                menus.append({
+                    'fecha': row.fecha_generacion.isoformat(),
+                    'presupuesto': float(row.presupuesto)
+                })
+            else:
+                menus.append(self._fila_menu(row))
         
-        for row in rows:
-            menus.append({
-                'fecha': row.fecha_generacion.isoformat(),
-                'presupuesto': float(row.presupuesto),
-                'menu': json.loads(row.menu_json),
-                'lista_compras': json.loads(row.lista_compras)
-            })
+        siguiente = rows.paging_state
+        return {
+            'menus': menus,
+            'siguientePagina': base64.urlsafe_b64encode(siguiente).decode('ascii') if siguiente else None
+        }
+    
+    def get_user_menu(self, user_id, fecha_generacion):
+        """
+        Obtiene un menú completo por su clave (user_id, fecha_generacion)
+        
+        Returns:
+            Dict con el menú o None si no existe
+        """
+        row = self._ejecutar('menu_usuario', [user_id, fecha_generacion]).one()
+        return self._fila_menu(row) if row else None
+    
+    def get_features_platos(self):
+        """
+        Lee la tabla compacta de agregados por plato (una fila por plato)
+        
+        Returns:
+            Dict plato_id -> (selecciones, suma_satisfaccion, valoraciones)
+        """
+        rows = self._ejecutar('features_platos')
+        return {
+            row.plato_id: (row.selecciones or 0, row.suma_satisfaccion or 0, row.valoraciones or 0)
+            for row in rows
+        }
+    
+    def marcar_feedback(self, user_id, fecha_generacion):
+        """
+        Marca un menú como valorado con una transacción ligera (IF NOT EXISTS)
+        
+        Returns:
+            True si es el primer feedback del menú, False si ya tenía
+        """
+        resultado = self._ejecutar('marcar_feedback', [user_id, fecha_generacion, datetime.now()])
+        return resultado.was_applied
+    
+    def desmarcar_feedback(self, user_id, fecha_generacion):
+        """Quita la marca de feedback de un menú (si no se pudo registrar)"""
+        self._ejecutar('desmarcar_feedback', [user_id, fecha_generacion])
+    
+    def registrar_feedback_platos(self, conteo, satisfaccion, concurrencia=50):
+        """
+        Incrementa los contadores de los platos de un menú valorado
+        
+        Los incrementos de counter no son idempotentes, así que no se
+        reintentan: si alguno falla se lanza el error para que quien llama
+        quite la marca de feedback del menú y pueda reenviarse (los platos
+        que sí se sumaron quedan sumados).
+        
+        Args:
+            conteo: Dict plato_id -> apariciones en el menú
+            satisfaccion: Valoración del menú (0-100)
+            concurrencia: Máximo de actualizaciones en vuelo simultáneamente
+            
+        Raises:
+            RuntimeError: Si algún incremento falló
+        """
+        prepared = self._statement('sumar_feedback_plato')
+        
+        from cassandra.concurrent import execute_concurrent_with_args
+        resultados = execute_concurrent_with_args(
+            self.session,
+            prepared,
+            [(veces, veces * satisfaccion, veces, plato_id) for plato_id, veces in conteo.items()],
+            concurrency=concurrencia,
+            raise_on_first_error=False
+        )
+        
+        fallidos = []
+        for plato_id, (success, result) in zip(conteo, resultados):
+            if not success:
+                print(f"Error registrando feedback del plato {plato_id}: {result}")
+                fallidos.append(result)
         
-        return menus
+        if fallidos:
+            raise RuntimeError(
+                f"Feedback sin registrar en {len(fallidos)} de {len(conteo)} platos"
+            ) from fallidos[0]
     
     def get_training_data(self):
         """Obtiene datos de entrenamiento del modelo"""
@@ -166,7 +674,7 @@ class KeyspacesConnection:
         LIMIT 1000
         """
         
-        rows = self.session.execute(query)
+        rows = self._ejecutar(query)
         
         training_data = []
         for row in rows:
@@ -174,7 +682,7 @@ class KeyspacesConnection:
                 'presupuesto': float(row.presupuesto),
                 'tipo_comida': row.tipo_comida,
                 'categoria': row.categoria,
-                'platos_seleccionados': json.loads(row.platos_seleccionados),
+                'platos_seleccionados': serializacion.loads(row.platos_seleccionados),
                 'satisfaccion': row.satisfaccion
             })
         
@@ -0,0 +1,364 @@
+import os
+import json
+import time
+import base64
+import sqlite3
+import serializacion
+from datetime import datetime, timedelta
+from decimal import Decimal
+from almacenamiento import Almacenamiento, HISTORIAL_POR_PAGINA, HISTORIAL_MAX_POR_PAGINA
+
+DIR_DATOS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS platos (
+    id INTEGER PRIMARY KEY,
+    nombre TEXT,
+    tipo TEXT,
+    categoria TEXT,
+    componente TEXT,
+    calorias INTEGER,
+    precio REAL,
+    momento_dia TEXT,
+    ingredientes TEXT,
+    preparacion TEXT
+);
+CREATE TABLE IF NOT EXISTS ingredientes (
+    nombre TEXT PRIMARY KEY,
+    precio REAL,
+    unidad TEXT,
+    venta_por TEXT,
+    precio_venta REAL,
+    categoria TEXT
+);
+CREATE TABLE IF NOT EXISTS menus_generados (
+    user_id TEXT,
+    fecha_generacion TEXT,
+    presupuesto REAL,
+    menu_json TEXT,
+    lista_compras TEXT,
+    PRIMARY KEY (user_id, fecha_generacion)
+);
+CREATE TABLE IF NOT EXISTS modelo_entrenamiento (
+    id TEXT PRIMARY KEY,
+    presupuesto REAL,
+    tipo_comida TEXT,
+    categoria TEXT,
+    platos_seleccionados TEXT,
+    satisfaccion INTEGER
+);
+CREATE TABLE IF NOT EXISTS features_platos (
+    plato_id INTEGER PRIMARY KEY,
+    selecciones INTEGER NOT NULL DEFAULT 0,
+    suma_satisfaccion INTEGER NOT NULL DEFAULT 0,
+    valoraciones INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS catalogo_metadata (
+    clave TEXT PRIMARY KEY,
+    valor TEXT
+);
+CREATE TABLE IF NOT EXISTS feedback_menus (
+    user_id TEXT,
+    fecha_generacion TEXT,
+    fecha_feedback TEXT,
+    PRIMARY KEY (user_id, fecha_generacion)
+);
+"""
+
+class SQLiteConnection(Almacenamiento):
+    """
+    Backend local sobre SQLite con el mismo esquema que Keyspaces
+    
+    Si la base está vacía se siembra con lambda/data, así que sirve para
+    desarrollo, pruebas de carga y despliegues self-hosted sin Keyspaces.
+    """
+    
+    def __init__(self, ruta=None):
+        super().__init__()
+        # En Lambda solo /tmp es escribible
+        self.ruta = ruta or os.environ.get('SQLITE_PATH', '/tmp/menu_semanal.db')
+    
+    def connect(self, preparar_consultas=False):
+        """
+        Abre (y si hace falta crea y siembra) la base SQLite
+        
+        Args:
+            preparar_consultas: Se acepta por compatibilidad; sqlite3 ya
+                                cachea las sentencias
+        """
+        print(f"Conectando a SQLite ({self.ruta})...")
+        inicio = time.perf_counter()
+        
+        self.session = sqlite3.connect(self.ruta, check_same_thread=False)
+        self.session.row_factory = sqlite3.Row
+        self.session.executescript(ESQUEMA)
+        self._sembrar_si_vacia()
+        
+        self.tiempos['conexionMs'] = round((time.perf_counter() - inicio) * 1000, 1)
+        print(f"Conexión exitosa a SQLite ({self.tiempos['conexionMs']} ms)")
+        return self.session
+    
+    def _sembrar_si_vacia(self):
+        """Carga platos e ingredientes desde lambda/data si las tablas están vacías"""
+        if self.session.execute("SELECT 1 FROM platos LIMIT 1").fetchone():
+            return
+        
+        with open(os.path.join(DIR_DATOS, 'platos.json'), 'r', encoding='utf-8') as f:
+            platos = json.load(f)
+        with open(os.path.join(DIR_DATOS, 'ingredientes.json'), 'r', encoding='utf-8') as f:
+            ingredientes = json.load(f)
+        
+        with self.session:
+            self.session.executemany(
+                "INSERT INTO platos VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        p['id'], p['nombre'], p['tipo'], p['categoria'], p['componente'],
+                        p['calorias'], p['precio'], json.dumps(p['momento_dia']),
+                        json.dumps(p['ingredientes']), p['preparacion']
+                    )
+                    for p in platos
+                ]
+            )
+            self.session.executemany(
+                "INSERT INTO ingredientes VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        nombre, d['precio'], d['unidad'], d.get('ventaPor', d['unidad']),
+                        d.get('precioVenta', d['precio']), d['categoria']
+                    )
+                    for nombre, d in ingredientes.items()
+                ]
+            )
+            self.session.execute(
+                "INSERT OR REPLACE INTO catalogo_metadata VALUES ('version', ?)",
+                (datetime.now().isoformat(),)
+            )
+        
+        print(f"SQLite sembrada con {len(platos)} platos y {len(ingredientes)} ingredientes")
+    
+    def close(self):
+        """Cierra la conexión"""
+        if self.session:
+            self.session.close()
+            self.session = None
+            print("Conexión cerrada")
+    
+    def get_version_catalogo(self):
+        """Sello de versión del catálogo ('' si no se publicó ninguno)"""
+        row = self.session.execute(
+            "SELECT valor FROM catalogo_metadata WHERE clave = 'version'"
+        ).fetchone()
+        return row['valor'] if row and row['valor'] else ''
+    
+    def get_all_platos(self):
+        """Obtiene todos los platos de la base de datos"""
+        rows = self.session.execute("SELECT * FROM platos")
+        
+        return [
+            {
+                'id': row['id'],
+                'nombre': row['nombre'],
+                'tipo': row['tipo'],
+                'categoria': row['categoria'],
+                'componente': row['componente'],
+                'calorias': row['calorias'],
+                'precio': float(row['precio']),
+                'momento_dia': json.loads(row['momento_dia']) if row['momento_dia'] else [],
+                'ingredientes': row['ingredientes'],
+                'preparacion': row['preparacion']
+            }
+            for row in rows
+        ]
+    
+    @staticmethod
+    def _info_ingrediente(row):
+        return {
+            'precio': float(row['precio']),
+            'unidad': row['unidad'],
+            'venta_por': row['venta_por'],
+            'precio_venta': float(row['precio_venta']) if row['precio_venta'] else float(row['precio']),
+            'categoria': row['categoria']
+        }
+    
+    def get_all_ingredientes(self):
+        """Obtiene la tabla completa de ingredientes indexada por nombre"""
+        rows = self.session.execute("SELECT * FROM ingredientes")
+        return {row['nombre']: self._info_ingrediente(row) for row in rows}
+    
+    def get_ingrediente_info(self, nombre):
+        """Obtiene información completa de un ingrediente"""
+        row = self.session.execute(
+            "SELECT * FROM ingredientes WHERE nombre = ?", (nombre,)
+        ).fetchone()
+        return self._info_ingrediente(row) if row else None
+    
+    def get_ingredientes_info(self, nombres):
+        """Obtiene la información de varios ingredientes en una sola consulta"""
+        nombres_unicos = list(dict.fromkeys(nombres))
+        if not nombres_unicos:
+            return {}
+        
+        marcadores = ', '.join('?' for _ in nombres_unicos)
+        rows = self.session.execute(
+            f"SELECT * FROM ingredientes WHERE nombre IN ({marcadores})", nombres_unicos
+        )
+        return {row['nombre']: self._info_ingrediente(row) for row in rows}
+    
+    def get_ingrediente_precio(self, nombre):
+        """Obtiene el precio de un ingrediente"""
+        info = self.get_ingrediente_info(nombre)
+        return Decimal(str(info['precio'])) if info else Decimal('5.0')
+    
+    def get_ingrediente_categoria(self, nombre):
+        """Obtiene la categoría de un ingrediente"""
+        info = self.get_ingrediente_info(nombre)
+        return info['categoria'] if info else 'otros'
+    
+    def save_menu(self, user_id, presupuesto, menu_json, lista_json):
+        """Guarda un menú generado"""
+        self.save_menus([(user_id, presupuesto, menu_json, lista_json)])
+        print(f"Menú guardado para usuario {user_id}")
+    
+    def save_menus(self, registros):
+        """
+        Guarda muchos menús en una sola transacción
+        
+        Returns:
+            Número de menús guardados
+        """
+        if not registros:
+            return 0
+        
+        # Mismo criterio que Keyspaces: 1 ms entre filas para no pisar la clave
+        fecha = datetime.now()
+        with self.session:
+            self.session.executemany(
+                "INSERT OR REPLACE INTO menus_generados VALUES (?, ?, ?, ?, ?)",
+                [
+                    (str(user_id), (fecha + timedelta(milliseconds=i)).isoformat(),
+                     float(presupuesto), menu_json, lista_json)
+                    for i, (user_id, presupuesto, menu_json, lista_json) in enumerate(registros)
+                ]
+            )
+        return len(registros)
+    
+    def _fila_menu(self, row):
+        """Convierte una fila completa de menus_generados en dict"""
+        return self._menu_desde_blobs(
+            datetime.fromisoformat(row['fecha_generacion']), row['presupuesto'],
+            row['menu_json'], row['lista_compras']
+        )
+    
+    def get_user_menus_pagina(self, user_id, limite=HISTORIAL_POR_PAGINA, pagina=None, resumen=False):
+        """
+        Obtiene una página del historial de menús de un usuario
+        
+        El token de página es el offset codificado, opaco igual que el
+        paging state de Keyspaces.
+        """
+        limite = max(1, min(int(limite), HISTORIAL_MAX_POR_PAGINA))
+        offset = int(base64.urlsafe_b64decode(pagina)) if pagina else 0
+        
+        columnas = 'fecha_generacion, presupuesto' if resumen else '*'
+        rows = self.session.execute(
+            f"""
+            SELECT {columnas} FROM menus_generados
+            WHERE user_id = ?
+            ORDER BY fecha_generacion DESC
+            LIMIT ? OFFSET ?
+            """,
+            (str(user_id), limite + 1, offset)
+        ).fetchall()
+        
+        menus = []
+        for row in rows[:limite]:
+            if resumen:
+                menus.append({
+                    'fecha': datetime.fromisoformat(row['fecha_generacion']).isoformat(),
+                    'presupuesto': float(row['presupuesto'])
+                })
+            else:
+                menus.append(self._fila_menu(row))
+        
+        siguiente = None
+        if len(rows) > limite:
+            siguiente = base64.urlsafe_b64encode(str(offset + limite).encode('ascii')).decode('ascii')
+        
+        return {
+            'menus': menus,
+            'siguientePagina': siguiente
+        }
+    
+    def get_user_menu(self, user_id, fecha_generacion):
+        """Obtiene un menú completo por su clave (user_id, fecha_generacion)"""
+        row = self.session.execute(
+            "SELECT * FROM menus_generados WHERE user_id = ? AND fecha_generacion = ?",
+            (str(user_id), fecha_generacion.isoformat())
+        ).fetchone()
+        return self._fila_menu(row) if row else None
+    
+    def get_features_platos(self):
+        """Lee la tabla compacta de agregados por plato"""
+        rows = self.session.execute(
+            "SELECT plato_id, selecciones, suma_satisfaccion, valoraciones FROM features_platos"
+        )
+        return {
+            row['plato_id']: (row['selecciones'], row['suma_satisfaccion'], row['valoraciones'])
+            for row in rows
+        }
+    
+    def marcar_feedback(self, user_id, fecha_generacion):
+        """Marca un menú como valorado; False si ya tenía feedback"""
+        with self.session:
+            cursor = self.session.execute(
+                "INSERT OR IGNORE INTO feedback_menus VALUES (?, ?, ?)",
+                (str(user_id), fecha_generacion.isoformat(), datetime.now().isoformat())
+            )
+        return cursor.rowcount == 1
+    
+    def desmarcar_feedback(self, user_id, fecha_generacion):
+        """Quita la marca de feedback de un menú"""
+        with self.session:
+            self.session.execute(
+                "DELETE FROM feedback_menus WHERE user_id = ? AND fecha_generacion = ?",
+                (str(user_id), fecha_generacion.isoformat())
+            )
+    
+    def registrar_feedback_platos(self, conteo, satisfaccion):
+        """Incrementa los agregados de los platos de un menú valorado"""
+        with self.session:
+            self.session.executemany(
+                """
+                INSERT INTO features_platos VALUES (?, ?, ?, ?)
+                ON CONFLICT (plato_id) DO UPDATE SET
+                    selecciones = selecciones + excluded.selecciones,
+                    suma_satisfaccion = suma_satisfaccion + excluded.suma_satisfaccion,
+                    valoraciones = valoraciones + excluded.valoraciones
+                """,
+                [
+                    (plato_id, veces, veces * satisfaccion, veces)
+                    for plato_id, veces in conteo.items()
+                ]
+            )
+    
+    def get_training_data(self):
+        """Obtiene datos de entrenamiento del modelo"""
+        rows = self.session.execute(
+            """
+            SELECT presupuesto, tipo_comida, categoria, platos_seleccionados, satisfaccion
+            FROM modelo_entrenamiento
+            LIMIT 1000
+            """
+        )
+        
+        return [
+            {
+                'presupuesto': float(row['presupuesto']),
+                'tipo_comida': row['tipo_comida'],
+                'categoria': row['categoria'],
+                'platos_seleccionados': serializacion.loads(row['platos_seleccionados']),
+                'satisfaccion': row['satisfaccion']
+            }
+            for row in rows
+        ]
@@ -0,0 +1,114 @@
+import os
+import random
+import threading
+
+class EscrituraDiferida:
+    """
+    Escrituras asíncronas (write-behind) sobre session.execute_async
+    
+    Limita las escrituras en vuelo (bloquea al encolar si se llega al máximo),
+    reintenta las fallidas con backoff exponencial y permite esperar a que
+    terminen antes de que Lambda congele el contenedor.
+    
+    Cada intento pide la sesión y la sentencia a `destino`, así un reintento
+    posterior a una reconexión usa la sesión nueva y no la que falló.
+    """
+    
+    def __init__(self, max_en_vuelo=None, reintentos=None, backoff_ms=None):
+        if max_en_vuelo is None:
+            max_en_vuelo = int(os.environ.get('ESCRITURAS_MAX_EN_VUELO', 32))
+        if reintentos is None:
+            reintentos = int(os.environ.get('ESCRITURAS_REINTENTOS', 2))
+        if backoff_ms is None:
+            backoff_ms = float(os.environ.get('ESCRITURAS_BACKOFF_MS', 100))
+        self.max_en_vuelo = max_en_vuelo
+        self.reintentos = reintentos
+        self.backoff = backoff_ms / 1000
+        
+        self._cupos = threading.BoundedSemaphore(max_en_vuelo)
+        self._vacio = threading.Condition()
+        self._pendientes = 0
+        
+        # Contadores
+        self.enviadas = 0
+        self.completadas = 0
+        self.fallidas = 0
+        self.reintentadas = 0
+    
+    def enviar(self, destino, parametros):
+        """
+        Encola una escritura sin esperar su resultado
+        
+        Args:
+            destino: Callable sin argumentos que devuelve (session, statement)
+            parametros: Valores de la sentencia
+        """
+        self._cupos.acquire()
+        with self._vacio:
+            self._pendientes += 1
+            self.enviadas += 1
+        self._ejecutar(destino, parametros, 0)
+    
+    def _ejecutar(self, destino, parametros, intento):
+        try:
+            session, statement = destino()
+            future = session.execute_async(statement, parametros)
+        except Exception as e:
+            self._error(e, destino, parametros, intento)
+            return
+        future.add_callbacks(
+            callback=self._ok,
+            errback=self._error,
+            errback_args=(destino, parametros, intento)
+        )
+    
+    def _ok(self, _resultado):
+        self._terminar(exito=True)
+    
+    def _error(self, excepcion, destino, parametros, intento):
+        if intento < self.reintentos:
+            with self._vacio:
+                self.reintentadas += 1
+            # El errback corre en el hilo del driver: la espera va en un Timer
+            espera = self.backoff * (2 ** intento) * random.uniform(0.5, 1.5)
+            temporizador = threading.Timer(
+                espera, self._ejecutar, args=(destino, parametros, intento + 1)
+            )
+            temporizador.daemon = True
+            temporizador.start()
+            return
+        
+        print(f"Error en escritura diferida tras {intento + 1} intentos: {excepcion}")
+        self._terminar(exito=False)
+    
+    def _terminar(self, exito):
+        with self._vacio:
+            if exito:
+                self.completadas += 1
+            else:
+                self.fallidas += 1
+            self._pendientes -= 1
+            if self._pendientes == 0:
+                self._vacio.notify_all()
+        self._cupos.release()
+    
+    def flush(self, timeout=None):
+        """
+        Espera a que terminen las escrituras en vuelo
+        
+        Returns:
+            True si no quedó ninguna pendiente
+        """
+        with self._vacio:
+            return self._vacio.wait_for(lambda: self._pendientes == 0, timeout)
+    
+    def estadisticas(self):
+        """Devuelve los contadores de escrituras"""
+        with self._vacio:
+            return {
+                'enviadas': self.enviadas,
+                'completadas': self.completadas,
+                'fallidas': self.fallidas,
+                'reintentadas': self.reintentadas,
+                'pendientes': self._pendientes
+            }
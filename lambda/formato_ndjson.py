@@ -0,0 +1,76 @@
+import serializacion
+from utils import (
+    calcular_lista_compras,
+    calcular_info_nutricional
+)
+
+CONTENT_TYPE_NDJSON = 'application/x-ndjson'
+
+def _linea(evento):
+    """Serializa un evento como una línea NDJSON"""
+    return serializacion.dumps(evento) + '\n'
+
+def quiere_ndjson(event):
+    """Indica si el cliente pidió la respuesta en formato NDJSON"""
+    query_params = event.get('queryStringParameters', {}) or {}
+    if query_params.get('formato') == 'ndjson':
+        return True
+    
+    headers = {k.lower(): v for k, v in (event.get('headers') or {}).items()}
+    return CONTENT_TYPE_NDJSON in headers.get('accept', '')
+
+def linea_error(mensaje):
+    """Línea NDJSON con un evento de error"""
+    return _linea({'tipo': 'error', 'success': False, 'error': mensaje})
+
+def generar_menu_ndjson(modelo, catalogo_ingredientes, presupuesto,
+                        preferencias_tipo, preferencias_categoria, guardar=None, modo=None):
+    """
+    Genera el menú y lo devuelve como un body NDJSON (un evento por línea)
+    
+    Es solo un formato de respuesta, no un camino de streaming: la semana
+    se genera completa igual que en JSON y todas las líneas viajan juntas en
+    un único body (la integración proxy de API Gateway con el runtime de
+    Python no envía respuestas parciales), así que no mejora la latencia.
+    
+    Args:
+        modelo: MenuMLLite ya entrenado
+        catalogo_ingredientes: Fuente de ingredientes para la lista de compras
+        presupuesto: Presupuesto semanal
+        preferencias_tipo: Lista de tipos de comida preferidos
+        preferencias_categoria: Lista de categorías preferidas
+        guardar: Callable opcional (menu_semanal, lista_compras) para persistir
+        modo: 'optimo' usa el optimizador de presupuesto; por defecto MENU_MODO
+        
+    Returns:
+        Body con líneas de eventos 'inicio', un 'dia' por día, 'listaCompras',
+        'infoNutricional' y 'fin' (o una línea 'error')
+    """
+    try:
+        modelo.usar_catalogo(catalogo_ingredientes)
+        menu_semanal = modelo.generar_menu_semanal(
+            presupuesto, preferencias_tipo, preferencias_categoria, modo=modo
+        )
+        lista_compras = calcular_lista_compras(menu_semanal, catalogo_ingredientes)
+        info_nutricional = calcular_info_nutricional(menu_semanal)
+        
+        if guardar:
+            guardar(menu_semanal, lista_compras)
+        
+        lineas = [_linea({'tipo': 'inicio', 'presupuesto': presupuesto})]
+        lineas.extend(
+            _linea({'tipo': 'dia', 'dia': dia, 'menu': menu_dia})
+            for dia, menu_dia in menu_semanal.items()
+        )
+        lineas.append(_linea({'tipo': 'listaCompras', 'listaCompras': lista_compras}))
+        lineas.append(_linea({'tipo': 'infoNutricional', 'infoNutricional': info_nutricional}))
+        lineas.append(_linea({
+            'tipo': 'fin',
+            'success': True,
+            'presupuestoTotal': sum(item['subtotal'] for item in lista_compras['items'])
+        }))
+        return ''.join(lineas)
+        
+    except Exception as e:
+        print(f"Error generando menú en NDJSON: {str(e)}")
+        return linea_error(str(e))
@@ -0,0 +1,140 @@
+import os
+import time
+import random
+import serializacion
+from contextlib import contextmanager, nullcontext
+
+# Namespace de las métricas EMF en CloudWatch
+NAMESPACE_METRICAS = 'MenuSemanal'
+
+# Traza de la invocación en curso (Lambda atiende una petición por contenedor)
+_traza_actual = None
+
+# La primera invocación de cada contenedor es un cold start
+_cold_start = True
+
+# Rutas sin parámetros; el resto se normaliza en plantilla_ruta
+RUTAS_FIJAS = ('/menu', '/menu/batch', '/feedback', '/platos')
+
+class Traza:
+    """Tiempos por etapa de una invocación"""
+    
+    def __init__(self, ruta, muestreada, debug):
+        self.ruta = ruta
+        self.muestreada = muestreada
+        self.debug = debug
+        self.inicio = time.perf_counter()
+        self.etapas = {}
+    
+    @contextmanager
+    def etapa(self, nombre):
+        """Mide una etapa; si se repite en la invocación se acumula"""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            duracion = (time.perf_counter() - inicio) * 1000
+            self.etapas[nombre] = self.etapas.get(nombre, 0.0) + duracion
+    
+    def total_ms(self):
+        return (time.perf_counter() - self.inicio) * 1000
+
+def _pide_debug(event):
+    """El cliente pide los tiempos con ?debug=timing o el header X-Debug-Timing"""
+    query_params = event.get('queryStringParameters', {}) or {}
+    if query_params.get('debug') == 'timing':
+        return True
+    headers = {k.lower(): v for k, v in (event.get('headers') or {}).items()}
+    return headers.get('x-debug-timing') == '1'
+
+def plantilla_ruta(path):
+    """
+    Plantilla de la ruta para usarla como dimensión de métricas
+    
+    Los ids y fechas de la ruta se reemplazan por su parámetro para no
+    crear una serie de CloudWatch por usuario o por plato.
+    """
+    if path in RUTAS_FIJAS:
+        return path
+    partes = path.strip('/').split('/')
+    if partes[0] == 'platos' and len(partes) == 2:
+        return '/platos/{id}'
+    if partes[0] == 'history' and len(partes) == 2:
+        return '/history/{userId}'
+    if partes[0] == 'history' and len(partes) >= 3:
+        return '/history/{userId}/{fecha}'
+    return 'desconocida'
+
+def iniciar(event):
+    """
+    Inicia la traza de una invocación
+    
+    Se muestrea una fracción TRAZAS_MUESTREO de las invocaciones (0.1 por
+    defecto); los cold starts y las peticiones con debug siempre se miden.
+    """
+    global _traza_actual
+    
+    muestreo = float(os.environ.get('TRAZAS_MUESTREO', 0.1))
+    debug = _pide_debug(event)
+    muestreada = debug or _cold_start or random.random() < muestreo
+    
+    _traza_actual = Traza(plantilla_ruta(event.get('path', '')), muestreada, debug)
+    return _traza_actual
+
+def etapa(nombre):
+    """
+    Context manager para medir una etapa de la invocación en curso
+    
+    Sin traza activa (o fuera de muestreo) no hace nada.
+    """
+    if _traza_actual is None or not _traza_actual.muestreada:
+        return nullcontext()
+    return _traza_actual.etapa(nombre)
+
+def _emitir_emf(traza, cold_start):
+    """Escribe las métricas en formato EMF (CloudWatch las extrae del log)"""
+    metricas = {nombre: round(ms, 2) for nombre, ms in traza.etapas.items()}
+    metricas['total'] = round(traza.total_ms(), 2)
+    
+    registro = {
+        '_aws': {
+            'Timestamp': int(time.time() * 1000),
+            'CloudWatchMetrics': [{
+                'Namespace': NAMESPACE_METRICAS,
+                'Dimensions': [['Ruta']],
+                'Metrics': [{'Name': nombre, 'Unit': 'Milliseconds'} for nombre in metricas]
+            }]
+        },
+        'Ruta': traza.ruta,
+        'ColdStart': cold_start
+    }
+    registro.update(metricas)
+    print(serializacion.dumps(registro))
+
+def finalizar(traza, respuesta):
+    """
+    Cierra la traza: emite las métricas y, si se pidió, añade el header
+    Server-Timing a la respuesta
+    
+    Returns:
+        La respuesta (posiblemente con el header añadido)
+    """
+    global _traza_actual, _cold_start
+    
+    cold_start = _cold_start
+    _cold_start = False
+    _traza_actual = None
+    
+    if not traza.muestreada:
+        return respuesta
+    
+    _emitir_emf(traza, cold_start)
+    
+    if traza.debug and isinstance(respuesta, dict):
+        valores = [f"{nombre};dur={ms:.1f}" for nombre, ms in traza.etapas.items()]
+        valores.append(f"total;dur={traza.total_ms():.1f}")
+        headers = respuesta.setdefault('headers', {})
+        headers['Server-Timing'] = ', '.join(valores)
+        headers['Access-Control-Expose-Headers'] = 'Server-Timing'
+    
+    return respuesta
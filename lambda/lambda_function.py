@@ -1,31 +1,117 @@
+import time
+_inicio_importaciones = time.perf_counter()
+
 import uuid
-import json
+import serializacion
+import instrumentacion
 import os
 from datetime import datetime
+from urllib.parse import unquote
 from decimal import Decimal
+from almacenamiento import crear_conexion
 from database import KeyspacesConnection
-from ml_model import MenuRandomForest
-from utils import (
-    calcular_lista_compras,
-    calcular_info_nutricional,
-    decimal_default
+from cache import ModeloCache
+from cache_menus import CacheMenus
+from catalogo_ingredientes import CatalogoIngredientes
+from batch import (
+    generar_menu_usuario,
+    generar_semanas_usuario,
+    generar_menus_lote,
+    guardar_menus_lote
+)
+from formato_ndjson import (
+    CONTENT_TYPE_NDJSON,
+    generar_menu_ndjson,
+    linea_error,
+    quiere_ndjson
 )
+from collections import Counter
+from utils import formatear_menu_compacto, ids_platos_menu
+
+# Tiempos de arranque del contenedor, reportados por la acción 'test'
+TIEMPOS_ARRANQUE = {
+    'importacionesMs': round((time.perf_counter() - _inicio_importaciones) * 1000, 1)
+}
+
+# Máximo de semanas por petición en el modo de planificación
+MAX_SEMANAS = 12
+
+# Espera máxima por los guardados diferidos antes de devolver; Lambda congela
+# el contenedor al devolver y las escrituras quedarían en el aire (con 0 no
+# se espera y se completan al descongelarse, si el contenedor sigue vivo)
+ESCRITURAS_FLUSH_MS = int(os.environ.get('ESCRITURAS_FLUSH_MS', 2000))
+
+# Inicializar conexión global (Keyspaces o SQLite según STORAGE_BACKEND)
+db = crear_conexion()
+
+# Catálogo y modelo reutilizados entre invocaciones (container reuse)
+modelo_cache = ModeloCache()
+
+# Tabla de ingredientes en memoria, recargada por TTL
+catalogo_ingredientes = CatalogoIngredientes()
+
+# Menús ya generados para parámetros repetidos (opcional, MENU_CACHE=1)
+menu_cache = CacheMenus()
+
+def _warmup_en_init():
+    """
+    Conecta a Keyspaces y prepara las consultas durante la fase de init,
+    donde Lambda asigna más CPU. Se desactiva con WARMUP_EN_INIT=0.
+    """
+    if os.environ.get('WARMUP_EN_INIT', '1') != '1':
+        return
+    # Sin credenciales no tiene sentido intentar conectar a Keyspaces
+    if isinstance(db, KeyspacesConnection) and not os.environ.get('KEYSPACES_USER'):
+        return
+    
+    inicio = time.perf_counter()
+    try:
+        db.connect(preparar_consultas=True)
+    except Exception as e:
+        # La primera petición volverá a intentar la conexión
+        print(f"Warm-up de conexión fallido: {str(e)}")
+    TIEMPOS_ARRANQUE['warmupMs'] = round((time.perf_counter() - inicio) * 1000, 1)
 
-# Inicializar conexión global
-db = KeyspacesConnection()
+_warmup_en_init()
 
 def lambda_handler(event, context):
     """
     Handler principal de Lambda
+    Mide las etapas de la invocación (con muestreo) y delega en procesar_evento
+    """
+    traza = instrumentacion.iniciar(event)
+    
+    # Guardados de invocaciones anteriores que siguen en vuelo tras descongelar
+    # el contenedor: se informan sin esperarlos
+    if not db.flush_escrituras(0):
+        print(f"Escrituras de invocaciones anteriores pendientes: {db.estadisticas_escrituras()}")
+    
+    respuesta = procesar_evento(event)
+    
+    # Los guardados se solapan con el armado y la serialización de la
+    # respuesta (ya hecha en procesar_evento); aquí solo se espera lo que falte
+    if ESCRITURAS_FLUSH_MS > 0:
+        with instrumentacion.etapa('flush_escrituras'):
+            if not db.flush_escrituras(ESCRITURAS_FLUSH_MS / 1000):
+                print(f"Escrituras pendientes al responder: {db.estadisticas_escrituras()}")
+    
+    return instrumentacion.finalizar(traza, respuesta)
+
+def procesar_evento(event):
+    """
     Maneja todas las rutas de la API
     """
-    print(f"Event received: {json.dumps(event)}")
+    # El evento completo solo se registra si se pide (incluye headers y body)
+    if os.environ.get('LOG_EVENTO') == '1':
+        print(f"Event received: {serializacion.dumps(event)}")
+    else:
+        print(f"Event received: {event.get('httpMethod', '')} {event.get('path', '')}")
     
     # Configurar headers CORS
     headers = {
         'Content-Type': 'application/json',
         'Access-Control-Allow-Origin': '*',
-        'Access-Control-Allow-Headers': 'Content-Type',
+        'Access-Control-Allow-Headers': 'Content-Type,X-Debug-Timing',
         'Access-Control-Allow-Methods': 'OPTIONS,POST,GET'
     }
     
@@ -47,7 +133,7 @@ def lambda_handler(event, context):
             return {
                 'statusCode': 200,
                 'headers': headers,
-                'body': json.dumps({
+                'body': serializacion.dumps({
                     'message': 'Lambda function is working!',
                     'timestamp': datetime.now().isoformat(),
                     'environment': {
@@ -55,7 +141,14 @@ def lambda_handler(event, context):
                         'has_keyspaces_password': bool(os.environ.get('KEYSPACES_PASSWORD')),
                         'region': os.environ.get('AWS_REGION', 'not-set'),
                         'aws_default_region': os.environ.get('AWS_DEFAULT_REGION', 'not-set')
-                    }
+                    },
+                    'modelCache': modelo_cache.estadisticas(),
+                    'menuCache': menu_cache.estadisticas(),
+                    'statements': db.estadisticas_consultas(),
+                    'ingredientes': catalogo_ingredientes.estadisticas(),
+                    'arranque': {**TIEMPOS_ARRANQUE, **db.tiempos},
+                    'escrituras': db.estadisticas_escrituras(),
+                    'conexion': db.estadisticas_conexion()
                 })
             }
         
@@ -64,21 +157,52 @@ def lambda_handler(event, context):
         method = event.get('httpMethod', '')
         
         # Router simple
-        if path == '/menu' and method == 'POST':
-            body = json.loads(event.get('body', '{}'))
+        if path == '/menu' and method == 'POST' and quiere_ndjson(event):
+            body = serializacion.loads(event.get('body', '{}'))
+            if int(body.get('semanas', 1)) > 1:
+                # El flujo NDJSON es de una semana; los planes van por JSON
+                return {
+                    'statusCode': 400,
+                    'headers': {**headers, 'Content-Type': CONTENT_TYPE_NDJSON},
+                    'body': linea_error('El formato NDJSON genera una sola semana; usar JSON para semanas > 1')
+                }
+            # Solo cambia el formato: el menú se genera entero como en JSON
+            return {
+                'statusCode': 200,
+                'headers': {**headers, 'Content-Type': CONTENT_TYPE_NDJSON},
+                'body': generar_menu_formato_ndjson(body)
+            }
+        elif path == '/menu' and method == 'POST':
+            body = serializacion.loads(event.get('body', '{}'))
             response_data = generar_menu(body)
+        elif path == '/menu/batch' and method == 'POST':
+            body = serializacion.loads(event.get('body', '{}'))
+            response_data = generar_menus_batch(body)
+        elif path == '/feedback' and method == 'POST':
+            body = serializacion.loads(event.get('body', '{}'))
+            response_data = registrar_feedback(body)
         elif path == '/platos' and method == 'GET':
             response_data = obtener_platos()
+        elif path.startswith('/platos/') and method == 'GET':
+            plato_id = path.split('/')[-1]
+            response_data = obtener_plato(plato_id)
         elif path.startswith('/history/') and method == 'GET':
-            user_id = path.split('/')[-1]
-            response_data = obtener_historial(user_id)
+            partes = path.strip('/').split('/')
+            if len(partes) >= 3:
+                # /history/{user_id}/{fecha_generacion}
+                response_data = obtener_menu_historial(partes[1], partes[2])
+            else:
+                response_data = obtener_historial(partes[-1], query_params)
         else:
             response_data = {'error': 'Ruta no encontrada', 'path': path, 'method': method}
             
+        with instrumentacion.etapa('serializacion'):
+            body = serializacion.dumps(response_data)
+        
         return {
             'statusCode': 200,
             'headers': headers,
-            'body': json.dumps(response_data, default=decimal_default)
+            'body': body
         }
         
     except Exception as e:
@@ -89,7 +213,7 @@ def lambda_handler(event, context):
         return {
             'statusCode': 500,
             'headers': headers,
-            'body': json.dumps({
+            'body': serializacion.dumps({
                 'error': 'Error interno del servidor',
                 'message': str(e)
             })
@@ -100,51 +224,88 @@ def generar_menu(params):
     Genera un menú semanal usando ML
     
     Args:
-        params: Dict con presupuesto, preferencias, etc.
+        params: Dict con presupuesto, preferencias, etc. Con 'semanas' > 1
+                planifica varias semanas seguidas; 'modo': 'optimo' usa el
+                optimizador de presupuesto
     
     Returns:
         Dict con el menú generado y lista de compras
     """
     try:
         # Conectar a la base de datos
-        if not db.session:
-            db.connect()
+        db.asegurar_sesion()
         
         # Obtener parámetros
         presupuesto = float(params.get('presupuesto', 200))
         user_id = uuid.UUID(params.get('userId', str(uuid.uuid4())))
         preferencias_tipo = params.get('tipoComida', [])
         preferencias_categoria = params.get('categoria', [])
+        semanas = max(1, min(int(params.get('semanas', 1)), MAX_SEMANAS))
+        modo = params.get('modo')
         
         print(f"Generando menú para presupuesto: S/ {presupuesto}")
         print(f"Preferencias tipo: {preferencias_tipo}")
         print(f"Preferencias categoría: {preferencias_categoria}")
         
-        # Obtener todos los platos
-        platos = db.get_all_platos()
+        # Obtener platos y modelo entrenado (cacheados entre invocaciones)
+        platos, modelo = modelo_cache.obtener(db)
         print(f"Platos disponibles: {len(platos)}")
         
-        # Crear y entrenar modelo ML
-        modelo = MenuRandomForest(platos)
-        modelo.entrenar_modelo()
-        
-        # Generar menú semanal
-        menu_semanal = modelo.generar_menu_semanal(
-            presupuesto=presupuesto,
-            preferencias_tipo=preferencias_tipo,
-            preferencias_categoria=preferencias_categoria
-        )
+        if semanas > 1:
+            return generar_plan_semanas(
+                modelo, user_id, presupuesto, semanas,
+                preferencias_tipo, preferencias_categoria, modo=modo
+            )
         
-        # Calcular lista de compras
-        lista_compras = calcular_lista_compras(menu_semanal, db)
+        # Generar menú semanal, lista de compras (con la tabla de ingredientes
+        # en memoria) e información nutricional
+        catalogo = catalogo_ingredientes.asegurar_vigente(db)
+        if menu_cache.activo:
+            # Las peticiones con los mismos parámetros normalizados reciben
+            # una de las variantes ya generadas para su tramo de presupuesto
+            clave, presupuesto_tramo, tipos, categorias = menu_cache.clave(
+                presupuesto, preferencias_tipo, preferencias_categoria, modo,
+                modelo_cache.version, catalogo.huella
+            )
+            with instrumentacion.etapa('cache_menus'):
+                menu_semanal, lista_compras, info_nutricional = menu_cache.obtener_o_generar(
+                    clave, str(user_id),
+                    lambda: generar_menu_usuario(
+                        modelo, catalogo, presupuesto_tramo, tipos, categorias, modo=modo
+                    )
+                )
+        else:
+            menu_semanal, lista_compras, info_nutricional = generar_menu_usuario(
+                modelo,
+                catalogo,
+                presupuesto,
+                preferencias_tipo,
+                preferencias_categoria,
+                modo=modo
+            )
         
-        # Calcular información nutricional
-        info_nutricional = calcular_info_nutricional(menu_semanal)
+        # Guardar en base de datos (formato compacto con platos deduplicados);
+        # la inserción es asíncrona y se espera en lambda_handler
+        menu_json = serializacion.dumps(formatear_menu_compacto(menu_semanal))
+        lista_json = serializacion.dumps(lista_compras)
+        with instrumentacion.etapa('guardado'):
+            db.save_menu_async(user_id, presupuesto, menu_json, lista_json)
         
-        # Guardar en base de datos
-        menu_json = json.dumps(menu_semanal, default=decimal_default)
-        lista_json = json.dumps(lista_compras, default=decimal_default)
-        db.save_menu(user_id, presupuesto, menu_json, lista_json)
+        if params.get('formato') == 'compacto':
+            # Slots con ids y un diccionario único de platos; la preparación
+            # se puede pedir después con GET /platos/{id}
+            compacto = formatear_menu_compacto(
+                menu_semanal, incluir_preparacion=params.get('incluirPreparacion', False)
+            )
+            return {
+                'success': True,
+                'formato': 'compacto',
+                'menu': compacto['menu'],
+                'platos': compacto['platos'],
+                'listaCompras': lista_compras,
+                'infoNutricional': info_nutricional,
+                'presupuestoTotal': sum(item['subtotal'] for item in lista_compras['items'])
+            }
         
         return {
             'success': True,
@@ -163,6 +324,160 @@ def generar_menu(params):
             'error': str(e)
         }
 
+def generar_menu_formato_ndjson(params):
+    """
+    Genera un menú semanal y lo devuelve en formato NDJSON (un evento por día)
+    
+    Es una alternativa de formato a generar_menu, no de latencia: el body
+    se arma completo antes de responder.
+    
+    Args:
+        params: Dict con presupuesto, preferencias, modo, etc. (una sola
+                semana: 'semanas' > 1 se rechaza en el router)
+    
+    Returns:
+        Body NDJSON
+    """
+    db.asegurar_sesion()
+    
+    presupuesto = float(params.get('presupuesto', 200))
+    user_id = uuid.UUID(params.get('userId', str(uuid.uuid4())))
+    
+    _, modelo = modelo_cache.obtener(db)
+    
+    def guardar(menu_semanal, lista_compras):
+        with instrumentacion.etapa('guardado'):
+            db.save_menu_async(
+                user_id,
+                presupuesto,
+                serializacion.dumps(formatear_menu_compacto(menu_semanal)),
+                serializacion.dumps(lista_compras)
+            )
+    
+    return generar_menu_ndjson(
+        modelo,
+        catalogo_ingredientes.asegurar_vigente(db),
+        presupuesto,
+        params.get('tipoComida', []),
+        params.get('categoria', []),
+        guardar=guardar,
+        modo=params.get('modo')
+    )
+
+def generar_plan_semanas(modelo, user_id, presupuesto, semanas,
+                         preferencias_tipo, preferencias_categoria, modo=None):
+    """
+    Planifica varias semanas con estado incremental y las guarda en un solo lote
+    
+    Returns:
+        Dict con la lista de semanas (menú, lista de compras e info nutricional)
+    """
+    plan = []
+    registros = []
+    for numero, menu_semanal, lista_compras, info_nutricional in generar_semanas_usuario(
+        modelo, catalogo_ingredientes.asegurar_vigente(db), presupuesto, semanas,
+        preferencias_tipo, preferencias_categoria, modo=modo
+    ):
+        plan.append({
+            'semana': numero,
+            'menu': menu_semanal,
+            'listaCompras': lista_compras,
+            'infoNutricional': info_nutricional,
+            'presupuestoTotal': sum(item['subtotal'] for item in lista_compras['items'])
+        })
+        registros.append((
+            user_id,
+            presupuesto,
+            serializacion.dumps(formatear_menu_compacto(menu_semanal)),
+            serializacion.dumps(lista_compras)
+        ))
+    
+    with instrumentacion.etapa('guardado'):
+        db.save_menus(registros)
+    
+    return {
+        'success': True,
+        'semanas': plan,
+        'presupuestoTotal': sum(semana['presupuestoTotal'] for semana in plan)
+    }
+
+def generar_menus_batch(params):
+    """
+    Genera menús para muchos usuarios en una sola invocación
+    
+    Args:
+        params: Dict con 'solicitudes' (lista de dicts con userId, presupuesto,
+                tipoComida y categoria), y opcionalmente 'procesos',
+                'incluirMenus' y 'pronostico' (cantidades totales a comprar)
+    
+    Returns:
+        Dict con el resumen del lote (y los menús si se pidieron)
+    """
+    try:
+        db.asegurar_sesion()
+        
+        # Cada item se normaliza al procesarlo: uno inválido no tumba el lote
+        solicitudes = params.get('solicitudes', [])
+        print(f"Generando lote de {len(solicitudes)} menús")
+        
+        # Un solo catálogo y modelo para todo el lote
+        platos, modelo = modelo_cache.obtener(db)
+        catalogo = catalogo_ingredientes.asegurar_vigente(db)
+        
+        # Solo los lotes usan la matriz: importarla aquí deja numpy fuera del arranque
+        from matriz_compras import obtener_matriz
+        matriz = obtener_matriz(platos, catalogo)
+        
+        resultados = generar_menus_lote(
+            modelo, catalogo, solicitudes, procesos=params.get('procesos'), matriz=matriz
+        )
+        with instrumentacion.etapa('guardado'):
+            guardados = guardar_menus_lote(db, resultados)
+        
+        incluir_menus = params.get('incluirMenus', False)
+        resumen = []
+        for r in resultados:
+            if 'error' in r:
+                resumen.append({'userId': str(r['userId']), 'success': False, 'error': r['error']})
+                continue
+            item = {
+                'userId': str(r['userId']),
+                'success': True,
+                'presupuestoTotal': sum(i['subtotal'] for i in r['listaCompras']['items'])
+            }
+            if incluir_menus:
+                item.update({
+                    'menu': r['menu'],
+                    'listaCompras': r['listaCompras'],
+                    'infoNutricional': r['infoNutricional']
+                })
+            resumen.append(item)
+        
+        respuesta = {
+            'success': True,
+            'total': len(resultados),
+            'guardados': guardados,
+            'errores': sum(1 for r in resultados if 'error' in r),
+            'resultados': resumen
+        }
+        
+        if params.get('pronostico') and matriz is not None:
+            # Compras agregadas de todos los usuarios del lote
+            respuesta['pronosticoCompras'] = matriz.pronostico_compras(
+                [r['menu'] for r in resultados if 'error' not in r]
+            )
+        
+        return respuesta
+        
+    except Exception as e:
+        print(f"Error generando lote de menús: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return {
+            'success': False,
+            'error': str(e)
+        }
+
 def obtener_platos():
     """
     Obtiene todos los platos disponibles
@@ -171,10 +486,9 @@ def obtener_platos():
         Dict con lista de platos
     """
     try:
-        if not db.session:
-            db.connect()
+        db.asegurar_sesion()
         
-        platos = db.get_all_platos()
+        platos, _ = modelo_cache.obtener(db)
         
         return {
             'success': True,
@@ -189,26 +503,69 @@ def obtener_platos():
             'error': str(e)
         }
 
-def obtener_historial(user_id):
+def obtener_plato(plato_id):
+    """
+    Obtiene un plato completo (incluida la preparación) por su id
+    
+    Args:
+        plato_id: ID del plato
+        
+    Returns:
+        Dict con el plato
+    """
+    try:
+        db.asegurar_sesion()
+        
+        _, modelo = modelo_cache.obtener(db)
+        plato = modelo.platos_por_id.get(int(plato_id))
+        
+        if not plato:
+            return {
+                'success': False,
+                'error': f'Plato {plato_id} no encontrado'
+            }
+        
+        return {
+            'success': True,
+            'plato': plato
+        }
+        
+    except Exception as e:
+        print(f"Error obteniendo plato: {str(e)}")
+        return {
+            'success': False,
+            'error': str(e)
+        }
+
+def obtener_historial(user_id, query_params=None):
     """
     Obtiene el historial de menús de un usuario
     
     Args:
         user_id: ID del usuario
+        query_params: Dict opcional con 'limite', 'pagina' (token de la
+                      página anterior) y 'resumen' ('1' para omitir los menús)
         
     Returns:
-        Dict con historial de menús
+        Dict con historial de menús y el token de la siguiente página
     """
     try:
-        if not db.session:
-            db.connect()
+        db.asegurar_sesion()
         
-        menus = db.get_user_menus(user_id)
+        query_params = query_params or {}
+        pagina = db.get_user_menus_pagina(
+            uuid.UUID(user_id),
+            limite=query_params.get('limite', 10),
+            pagina=query_params.get('pagina'),
+            resumen=query_params.get('resumen') in ('1', 'true')
+        )
+        menus = pagina['menus']
         
         return {
             'success': True,
             'historial': menus,
-            'total': len(menus)
+            'total': len(menus),
+            'siguientePagina': pagina['siguientePagina']
         }
         
     except Exception as e:
@@ -218,6 +575,105 @@ def obtener_historial(user_id):
             'error': str(e)
         }
 
+def obtener_menu_historial(user_id, fecha):
+    """
+    Obtiene un menú completo del historial por su fecha de generación
+    
+    Args:
+        user_id: ID del usuario
+        fecha: Fecha de generación en ISO 8601 (el campo 'fecha' del historial)
+        
+    Returns:
+        Dict con el menú
+    """
+    try:
+        db.asegurar_sesion()
+        
+        menu = db.get_user_menu(uuid.UUID(user_id), datetime.fromisoformat(unquote(fecha)))
+        
+        if not menu:
+            return {
+                'success': False,
+                'error': 'Menú no encontrado'
+            }
+        
+        return {
+            'success': True,
+            'menu': menu
+        }
+        
+    except Exception as e:
+        print(f"Error obteniendo menú del historial: {str(e)}")
+        return {
+            'success': False,
+            'error': str(e)
+        }
+
+def registrar_feedback(params):
+    """
+    Registra la valoración de un menú del historial
+    
+    Actualiza los agregados por plato en la base de datos y el modelo en
+    memoria, sin reentrenar desde modelo_entrenamiento. Cada menú admite
+    una sola valoración.
+    
+    Args:
+        params: Dict con userId, fecha (la del historial) y satisfaccion (0-100)
+        
+    Returns:
+        Dict con el número de platos actualizados
+    """
+    try:
+        db.asegurar_sesion()
+        
+        satisfaccion = int(params.get('satisfaccion', -1))
+        if not 0 <= satisfaccion <= 100:
+            return {
+                'success': False,
+                'error': 'La satisfacción debe estar entre 0 y 100'
+            }
+        
+        user_id = uuid.UUID(params.get('userId', ''))
+        fecha = datetime.fromisoformat(params.get('fecha', ''))
+        menu = db.get_user_menu(user_id, fecha)
+        if not menu:
+            return {
+                'success': False,
+                'error': 'Menú no encontrado'
+            }
+        
+        # La marca va antes de sumar: dos envíos simultáneos no cuentan doble
+        if not db.marcar_feedback(user_id, fecha):
+            return {
+                'success': False,
+                'error': 'El menú ya tiene feedback'
+            }
+        
+        platos_ids = ids_platos_menu(menu['menu'])
+        try:
+            db.registrar_feedback_platos(Counter(platos_ids), satisfaccion)
+        except Exception:
+            # Sin sumar no cuenta como valorado: se puede reenviar
+            db.desmarcar_feedback(user_id, fecha)
+            raise
+        
+        # El modelo del contenedor se actualiza ya; los demás contenedores
+        # leen los agregados al reconstruir su modelo
+        _, modelo = modelo_cache.obtener(db)
+        modelo.retroalimentar(platos_ids, satisfaccion)
+        
+        return {
+            'success': True,
+            'platosActualizados': len(set(platos_ids))
+        }
+        
+    except Exception as e:
+        print(f"Error registrando feedback: {str(e)}")
+        return {
+            'success': False,
+            'error': str(e)
+        }
+
 # Mantener la conexión entre invocaciones (Lambda container reuse)
 def close_connection():
     """Cierra la conexión a la base de datos"""
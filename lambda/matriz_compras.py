@@ -0,0 +1,165 @@
+from utils import organizar_lista_compras, totales_por_indice
+
+# numpy es opcional: sin él los lotes usan el cálculo por menú
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+class MatrizCompras:
+    """
+    Matriz plato x ingrediente con las cantidades de compra de cada plato
+    
+    Con ella la lista de compras de un menú es un vector de conteos por
+    plato multiplicado por la matriz, y un lote de N menús es un solo
+    producto matricial. La información nutricional es el producto con la
+    columna de calorías.
+    """
+    
+    def __init__(self, platos, catalogo):
+        # Referencias (no ids) para que la vigencia no confunda objetos recolectados
+        self.platos = platos
+        self.catalogo = catalogo
+        self.cargado_en = catalogo.cargado_en
+        self.posicion_por_id = {p['id']: i for i, p in enumerate(platos)}
+        
+        # Densa: con cientos de ingredientes sigue siendo pequeña y evita scipy
+        self.cantidades = np.zeros((len(platos), len(catalogo.nombres)), dtype=np.float64)
+        for i, plato in enumerate(platos):
+            for indice, cantidad in catalogo.lineas_plato(plato):
+                self.cantidades[i, indice] += cantidad
+        
+        # Calorías para 2 personas
+        self.calorias = np.array([p['calorias'] * 2 for p in platos], dtype=np.float64)
+    
+    def vigente(self, platos, catalogo):
+        """Indica si la matriz corresponde a estos platos y a la carga actual del catálogo"""
+        return (platos is self.platos and catalogo is self.catalogo
+                and catalogo.cargado_en == self.cargado_en)
+    
+    def _conteos_por_dia(self, menus):
+        """
+        Conteos de platos por (menú, día)
+        
+        Returns:
+            Tuple con la matriz (N*dias x platos) y la lista de días de cada menú
+        """
+        dias_por_menu = [list(menu) for menu in menus]
+        conteos = np.zeros((sum(len(d) for d in dias_por_menu), len(self.posicion_por_id)))
+        fila = 0
+        for menu in menus:
+            for momentos in menu.values():
+                for platos in momentos.values():
+                    for plato in platos.values():
+                        if plato:
+                            conteos[fila, self.posicion_por_id[plato['id']]] += 1
+                fila += 1
+        return conteos, dias_por_menu
+    
+    def _conteos(self, menus):
+        """Conteos de platos por menú (N x platos)"""
+        if not menus:
+            return np.zeros((0, len(self.posicion_por_id)))
+        conteos, dias_por_menu = self._conteos_por_dia(menus)
+        # Sumar las filas de cada menú; un menú sin días queda en cero
+        # (reduceat repetiría la fila siguiente)
+        menu_por_fila = np.repeat(np.arange(len(menus)), [len(dias) for dias in dias_por_menu])
+        por_menu = np.zeros((len(menus), conteos.shape[1]))
+        np.add.at(por_menu, menu_por_fila, conteos)
+        return por_menu
+    
+    def cantidades_lote(self, menus):
+        """Cantidades de compra por menú (N x ingredientes) en un solo producto"""
+        return self._conteos(menus) @ self.cantidades
+    
+    def listas_compras(self, menus):
+        """
+        Listas de compras de muchos menús
+        
+        Returns:
+            Lista con el mismo formato que calcular_lista_compras, una por menú
+        """
+        listas = []
+        for fila in self.cantidades_lote(menus):
+            indices = np.flatnonzero(fila)
+            listas.append(organizar_lista_compras(
+                totales_por_indice(dict(zip(indices.tolist(), fila[indices].tolist())), self.catalogo)
+            ))
+        return listas
+    
+    def infos_nutricionales(self, menus):
+        """
+        Información nutricional de muchos menús
+        
+        Returns:
+            Lista con el mismo formato que calcular_info_nutricional
+        """
+        conteos, dias_por_menu = self._conteos_por_dia(menus)
+        calorias_dia = conteos @ self.calorias
+        platos_dia = conteos.sum(axis=1)
+        
+        infos = []
+        fila = 0
+        for dias in dias_por_menu:
+            calorias_por_dia = {}
+            total_calorias = 0
+            total_platos = 0
+            for dia in dias:
+                calorias_por_dia[dia] = int(calorias_dia[fila])
+                total_calorias += calorias_por_dia[dia]
+                total_platos += int(platos_dia[fila])
+                fila += 1
+            
+            promedio_diario = total_calorias / 7 if total_calorias > 0 else 0
+            infos.append({
+                'totalSemanal': round(total_calorias, 2),
+                'promedioDiario': round(promedio_diario, 2),
+                'promedioPorPersona': round(promedio_diario / 2, 2),
+                'caloriasPorDia': calorias_por_dia,
+                'totalPlatos': total_platos
+            })
+        return infos
+    
+    def pronostico_compras(self, menus):
+        """
+        Cantidades totales a comprar sumando todos los menús
+        
+        Returns:
+            Lista de dicts con ingrediente, cantidad, unidad, venta_por y
+            categoria, ordenada por ingrediente
+        """
+        totales = self._conteos(menus).sum(axis=0) @ self.cantidades
+        pronostico = []
+        for indice in np.flatnonzero(totales):
+            info = self.catalogo.infos[indice]
+            pronostico.append({
+                'ingrediente': self.catalogo.nombres[indice],
+                'cantidad': round(float(totales[indice]), 2),
+                'unidad': info['unidad'],
+                'venta_por': info.get('venta_por', info['unidad']),
+                'categoria': info['categoria']
+            })
+        pronostico.sort(key=lambda item: item['ingrediente'])
+        return pronostico
+
+# Última matriz construida; se reutiliza mientras no cambien platos ni catálogo
+_matriz = None
+
+def obtener_matriz(platos, catalogo):
+    """
+    Devuelve la matriz del catálogo actual, construyéndola si hace falta
+    
+    Args:
+        platos: Lista de platos del ModeloCache (se reemplaza al recargar)
+        catalogo: CatalogoIngredientes con índice de ingredientes
+        
+    Returns:
+        MatrizCompras, o None si numpy no está disponible
+    """
+    global _matriz
+    if np is None or not hasattr(catalogo, 'lineas_plato'):
+        return None
+    
+    if _matriz is None or not _matriz.vigente(platos, catalogo):
+        _matriz = MatrizCompras(platos, catalogo)
+    return _matriz
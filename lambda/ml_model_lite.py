@@ -1,8 +1,39 @@
+import os
 import json
 import random
 import math
+import heapq
+from bisect import bisect_right
 from collections import defaultdict
 from datetime import datetime
+from itertools import islice
+from paralelo import map_en_procesos
+
+# numpy es opcional: el paquete de despliegue solo incluye cassandra-driver
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Componentes reales del catálogo que cubren cada componente lógico del menú
+GRUPOS_COMPONENTE = {
+    'principal': ('sandwich', 'fondo')
+}
+
+# Tipos que reciben bonus de fin de semana (platos más elaborados)
+TIPOS_FIN_DE_SEMANA = ('criolla', 'marina')
+
+DIAS_SEMANA = ['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Sábado', 'Domingo']
+
+# Presupuesto y distribución - MODIFICADO para dar más a cena
+DISTRIBUCION_MOMENTOS = {
+    'desayuno': 0.20,  # Reducido de 0.25
+    'almuerzo': 0.45,  # Reducido de 0.50
+    'cena': 0.35       # Aumentado de 0.25
+}
+
+# Máximo de veces que un plato puede aparecer en la semana
+LIMITE_REPETICIONES = 3
 
 class MenuMLLite:
     """
@@ -10,13 +41,15 @@ class MenuMLLite:
     Usa un sistema de scoring basado en múltiples factores
     """
     
-    def __init__(self, platos_data):
+    def __init__(self, platos_data, vectorizado=None):
         self.platos_data = platos_data
         self.platos_por_id = {p['id']: p for p in platos_data}
         
-        # Historial para aprendizaje
+        # Historial para aprendizaje: agregados por plato que se actualizan
+        # de forma incremental (selecciones, suma y número de valoraciones)
         self.historial_selecciones = defaultdict(int)
-        self.historial_satisfaccion = defaultdict(list)
+        self.suma_satisfaccion = defaultdict(int)
+        self.valoraciones = defaultdict(int)
         
         # Pesos del modelo (se pueden ajustar con entrenamiento)
         self.pesos = {
@@ -30,64 +63,287 @@ class MenuMLLite:
         # Cache de features calculadas
         self.features_cache = {}
         
+        # Costo real de compra por plato (ver usar_catalogo)
+        self.costos_compras = None
+        
+        # Índice de candidatos por (momento, componente, tipo, categoria)
+        self._construir_indice()
+        
+        # Scoring vectorizado con numpy (por defecto si está disponible)
+        if vectorizado is None:
+            vectorizado = np is not None
+        self.vectorizado = vectorizado and np is not None
+        if self.vectorizado:
+            self._construir_columnas()
+        
+    def _construir_indice(self):
+        """
+        Construye el índice de candidatos una sola vez por catálogo.
+        Cada bucket (momento, componente, tipo, categoria) queda ordenado
+        por precio para poder cortar por presupuesto con bisect.
+        """
+        buckets = defaultdict(list)
+        for plato in self.platos_data:
+            for momento in set(plato.get('momento_dia', [])):
+                clave = (momento, plato['componente'], plato.get('tipo'), plato.get('categoria'))
+                buckets[clave].append(plato)
+        
+        self.indice_candidatos = {}
+        self.claves_por_slot = defaultdict(list)
+        for clave, platos in buckets.items():
+            platos.sort(key=lambda p: p['precio'])
+            self.indice_candidatos[clave] = ([p['precio'] for p in platos], platos)
+            self.claves_por_slot[(clave[0], clave[1])].append(clave)
+    
+    def _buckets_slot(self, momento, componente, pref_tipo=None, pref_cat=None):
+        """Devuelve los buckets (precios, platos) que aplican a un slot del menú"""
+        buckets = []
+        for comp in GRUPOS_COMPONENTE.get(componente, (componente,)):
+            for clave in self.claves_por_slot.get((momento, comp), []):
+                if pref_tipo and clave[2] not in pref_tipo:
+                    continue
+                if pref_cat and clave[3] not in pref_cat:
+                    continue
+                buckets.append(self.indice_candidatos[clave])
+        return buckets
+    
+    def _platos_hasta_precio(self, momento, componente, precio_max, pref_tipo=None, pref_cat=None):
+        """Itera los platos del slot con precio <= precio_max usando bisect"""
+        for precios, platos in self._buckets_slot(momento, componente, pref_tipo, pref_cat):
+            corte = bisect_right(precios, precio_max)
+            for i in range(corte):
+                yield platos[i]
+    
+    def _mas_baratos(self, momento, componentes, cantidad):
+        """Devuelve los `cantidad` platos más baratos del slot mezclando buckets ordenados"""
+        buckets = [
+            self.indice_candidatos[clave]
+            for comp in componentes
+            for clave in self.claves_por_slot.get((momento, comp), [])
+        ]
+        ordenados = heapq.merge(*(platos for _, platos in buckets), key=lambda p: p['precio'])
+        return list(islice(ordenados, cantidad))
+        
+    def _construir_columnas(self):
+        """Representa el catálogo como columnas numpy para el scoring vectorizado"""
+        self.posicion_por_id = {p['id']: i for i, p in enumerate(self.platos_data)}
+        
+        tipos = sorted({str(p.get('tipo')) for p in self.platos_data})
+        self.codigo_tipo = {tipo: i for i, tipo in enumerate(tipos)}
+        
+        self.col_precio = np.array([p['precio'] for p in self.platos_data], dtype=np.float64)
+        self.col_calorias = np.array(
+            [self._score_calorias(p['calorias']) for p in self.platos_data], dtype=np.float64
+        )
+        self.col_tipo = np.array(
+            [self.codigo_tipo[str(p.get('tipo'))] for p in self.platos_data], dtype=np.int32
+        )
+        self.col_fin_de_semana = np.isin(
+            self.col_tipo, [self.codigo_tipo[t] for t in TIPOS_FIN_DE_SEMANA if t in self.codigo_tipo]
+        )
+        self.col_popularidad = np.full(len(self.platos_data), 0.5)
+    
     def entrenar_modelo(self, datos_entrenamiento=None):
         """Entrena el modelo con datos históricos si existen"""
         if datos_entrenamiento:
             for dato in datos_entrenamiento:
                 # Actualizar historial
                 for plato_id in dato.get('platos_seleccionados', []):
-                    self.historial_selecciones[plato_id] += 1
-                    self.historial_satisfaccion[plato_id].append(
-                        dato.get('satisfaccion', 70)
-                    )
+                    self._acumular(plato_id, dato.get('satisfaccion', 70))
         
         # Calcular popularidad de cada plato
         self._calcular_popularidad()
         
         print(f"Modelo entrenado con {len(self.historial_selecciones)} platos históricos")
     
+    def cargar_features(self, tabla):
+        """
+        Carga los agregados precalculados por plato en lugar de entrenar
+        desde las filas de modelo_entrenamiento
+        
+        Args:
+            tabla: Dict plato_id -> (selecciones, suma_satisfaccion, valoraciones)
+        """
+        for plato_id, (selecciones, suma, valoraciones) in tabla.items():
+            self.historial_selecciones[plato_id] = selecciones
+            self.suma_satisfaccion[plato_id] = suma
+            self.valoraciones[plato_id] = valoraciones
+        
+        self._calcular_popularidad()
+        
+        print(f"Features cargadas para {len(tabla)} platos")
+    
+    def _acumular(self, plato_id, satisfaccion):
+        """Suma una selección valorada a los agregados de un plato"""
+        self.historial_selecciones[plato_id] += 1
+        self.suma_satisfaccion[plato_id] += satisfaccion
+        self.valoraciones[plato_id] += 1
+    
+    def _features_plato(self, plato_id, max_selecciones):
+        """Features de popularidad y satisfacción de un plato a partir de sus agregados"""
+        selecciones = self.historial_selecciones.get(plato_id, 0)
+        valoraciones = self.valoraciones.get(plato_id, 0)
+        
+        # Popularidad normalizada
+        popularidad = selecciones / max_selecciones if max_selecciones > 0 else 0
+        
+        # Satisfacción promedio (70 si el plato no tiene valoraciones)
+        satisfaccion_avg = self.suma_satisfaccion[plato_id] / valoraciones if valoraciones else 70
+        
+        return {
+            'popularidad': popularidad,
+            'satisfaccion': satisfaccion_avg / 100
+        }
+    
     def _calcular_popularidad(self):
         """Calcula score de popularidad basado en selecciones históricas"""
         max_selecciones = max(self.historial_selecciones.values()) if self.historial_selecciones else 1
         
         for plato in self.platos_data:
-            plato_id = plato['id']
-            selecciones = self.historial_selecciones.get(plato_id, 0)
-            satisfacciones = self.historial_satisfaccion.get(plato_id, [70])
-            
-            # Popularidad normalizada
-            popularidad = selecciones / max_selecciones if max_selecciones > 0 else 0
-            
-            # Satisfacción promedio
-            satisfaccion_avg = sum(satisfacciones) / len(satisfacciones)
+            self.features_cache[plato['id']] = self._features_plato(plato['id'], max_selecciones)
+        
+        if self.vectorizado:
+            self.col_popularidad = np.array(
+                [self.features_cache[p['id']]['popularidad'] for p in self.platos_data],
+                dtype=np.float64
+            )
+    
+    def usar_catalogo(self, catalogo):
+        """
+        Selecciona los platos por su costo real en la lista de compras
+        
+        Precalcula el costo de compra de cada plato con los precios del
+        catálogo (una vez por carga). Sin catálogo en memoria, o con
+        MENU_COSTO_COMPRAS=0, se usa el precio del plato como hasta ahora.
+        
+        Args:
+            catalogo: CatalogoIngredientes o la conexión a la base de datos
+        """
+        if os.environ.get('MENU_COSTO_COMPRAS', '1') == '0' or not hasattr(catalogo, 'lineas_plato'):
+            self.costos_compras = None
+            return
+        
+        if self.costos_compras is None or not self.costos_compras.vigente(catalogo):
+            from costo_compras import CostosCompras
+            self.costos_compras = CostosCompras(self.platos_data, catalogo)
+    
+    def nuevo_estado_planificacion(self):
+        """Estado que se arrastra de una semana a la siguiente en la planificación"""
+        return {
+            'semana': 0,
+            'ultimos_tipos': {momento: [] for momento in DISTRIBUCION_MOMENTOS}
+        }
+    
+    def planificar_semanas(self, presupuesto, semanas, preferencias_tipo=None,
+                           preferencias_categoria=None, estado=None, paralelo=False, procesos=None,
+                           modo=None):
+        """
+        Planifica N semanas seguidas, entregando cada semana apenas está lista
+        
+        El límite de repeticiones es semanal, mientras que los tipos recientes
+        de cada momento se arrastran entre semanas para que el lunes no repita
+        lo servido el domingo anterior.
+        
+        Args:
+            presupuesto: Presupuesto de cada semana
+            semanas: Número de semanas a planificar
+            estado: Estado de una planificación previa para continuarla
             
-            # Score combinado
-            self.features_cache[plato_id] = {
-                'popularidad': popularidad,
-                'satisfaccion': satisfaccion_avg / 100
-            }
+        Yields:
+            Tuple (numero_semana, menu_semanal)
+        """
+        if estado is None:
+            estado = self.nuevo_estado_planificacion()
+        
+        for _ in range(semanas):
+            menu_semanal = self.generar_menu_semanal(
+                presupuesto, preferencias_tipo, preferencias_categoria,
+                paralelo=paralelo, procesos=procesos, estado=estado, modo=modo
+            )
+            estado['semana'] += 1
+            yield estado['semana'], menu_semanal
     
-    def generar_menu_semanal(self, presupuesto, preferencias_tipo=None, preferencias_categoria=None):
-        """Genera un menú semanal optimizado"""
-        menu_semanal = {}
-        dias_semana = ['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Sábado', 'Domingo']
+    def generar_menu_semanal(self, presupuesto, preferencias_tipo=None, preferencias_categoria=None,
+                             paralelo=False, procesos=None, estado=None, modo=None):
+        """
+        Genera un menú semanal optimizado
+        
+        Args:
+            presupuesto: Presupuesto semanal
+            preferencias_tipo: Lista de tipos de comida preferidos
+            preferencias_categoria: Lista de categorías preferidas
+            paralelo: Si es True genera cada momento del día en un proceso distinto
+            procesos: Número de procesos para el modo paralelo
+            estado: Estado de planificación a continuar (ver planificar_semanas)
+            modo: 'optimo' resuelve la semana completa con el optimizador
+                  (con la heurística como fallback); por defecto MENU_MODO
+        """
+        if estado is None:
+            estado = self.nuevo_estado_planificacion()
+        
+        if (modo or os.environ.get('MENU_MODO', 'heuristico')) == 'optimo':
+            menu_semanal = self._generar_menu_optimo(
+                presupuesto, preferencias_tipo, preferencias_categoria, estado
+            )
+            if menu_semanal is not None:
+                return menu_semanal
+        
+        if paralelo:
+            return self._generar_menu_semanal_paralelo(
+                presupuesto, preferencias_tipo, preferencias_categoria, estado, procesos
+            )
+        
+        return dict(self.iterar_menu_semanal(
+            presupuesto, preferencias_tipo, preferencias_categoria, estado
+        ))
+    
+    def _generar_menu_optimo(self, presupuesto, preferencias_tipo, preferencias_categoria, estado):
+        """
+        Semana completa con el optimizador exacto
+        
+        Returns:
+            El menú semanal, o None si no hubo solución a tiempo
+        """
+        from optimizador import OptimizadorMenu
+        
+        menu_semanal = OptimizadorMenu(self).generar(
+            presupuesto, preferencias_tipo, preferencias_categoria
+        )
+        if menu_semanal is None:
+            return None
+        
+        # Mantener los tipos recientes para la semana siguiente
+        platos_usados = defaultdict(int)
+        for menu_dia in menu_semanal.values():
+            for momento, platos_momento in menu_dia.items():
+                self._registrar_seleccion(platos_momento, platos_usados, estado['ultimos_tipos'][momento])
+        
+        return menu_semanal
+    
+    def iterar_menu_semanal(self, presupuesto, preferencias_tipo=None,
+                            preferencias_categoria=None, estado=None):
+        """
+        Genera la semana día a día (modo secuencial)
+        
+        Yields:
+            Tuple (dia, menu_del_dia) en cuanto cada día está listo
+        """
+        if estado is None:
+            estado = self.nuevo_estado_planificacion()
         
-        # Presupuesto y distribución - MODIFICADO para dar más a cena
         presupuesto_diario = presupuesto / 7
-        distribucion = {
-            'desayuno': 0.20,  # Reducido de 0.25
-            'almuerzo': 0.45,  # Reducido de 0.50
-            'cena': 0.35       # Aumentado de 0.25
-        }
         
         # Tracking para evitar repeticiones
         platos_usados_global = defaultdict(int)
-        ultimos_tipos = {'desayuno': [], 'almuerzo': [], 'cena': []}
+        ultimos_tipos = estado['ultimos_tipos']
+        
+        # Ingredientes que ya se compran esta semana
+        carrito = self.costos_compras.nuevo_carrito() if self.costos_compras else None
         
-        for idx_dia, dia in enumerate(dias_semana):
-            menu_semanal[dia] = {}
+        for idx_dia, dia in enumerate(DIAS_SEMANA):
+            menu_dia = {}
             
-            for momento, porcentaje in distribucion.items():
+            for momento, porcentaje in DISTRIBUCION_MOMENTOS.items():
                 presupuesto_momento = presupuesto_diario * porcentaje
                 
                 # Seleccionar platos con ML
@@ -98,25 +354,124 @@ class MenuMLLite:
                     preferencias_categoria=preferencias_categoria,
                     platos_usados=platos_usados_global,
                     ultimos_tipos=ultimos_tipos[momento],
-                    dia_semana=idx_dia
+                    dia_semana=idx_dia,
+                    carrito=carrito
                 )
                 
                 # Actualizar tracking
-                for componente, plato in platos_momento.items():
-                    if plato and 'id' in plato:
-                        platos_usados_global[plato['id']] += 1
-                        if 'tipo' in plato:
-                            ultimos_tipos[momento].append(plato['tipo'])
-                            if len(ultimos_tipos[momento]) > 3:
-                                ultimos_tipos[momento].pop(0)
+                self._registrar_seleccion(platos_momento, platos_usados_global, ultimos_tipos[momento])
                 
-                menu_semanal[dia][momento] = platos_momento
+                menu_dia[momento] = platos_momento
+            
+            yield dia, menu_dia
+    
+    def _registrar_seleccion(self, platos_momento, platos_usados, ultimos_tipos):
+        """Actualiza el tracking de repeticiones y tipos recientes"""
+        for componente, plato in platos_momento.items():
+            if plato and 'id' in plato:
+                platos_usados[plato['id']] += 1
+                if 'tipo' in plato:
+                    ultimos_tipos.append(plato['tipo'])
+                    if len(ultimos_tipos) > 3:
+                        ultimos_tipos.pop(0)
+    
+    def _cupos_por_momento(self):
+        """
+        Reparte de forma determinista el límite de repeticiones de cada plato
+        entre los momentos del día en los que puede servirse.
+        
+        Returns:
+            Dict momento -> {plato_id: cupo de repeticiones en ese momento};
+            los platos de un solo momento no aparecen (su cupo es el límite)
+        """
+        cupos = {momento: {} for momento in DISTRIBUCION_MOMENTOS}
+        for plato in self.platos_data:
+            momentos = [m for m in DISTRIBUCION_MOMENTOS if m in plato.get('momento_dia', [])]
+            if len(momentos) < 2:
+                continue
+            base, extra = divmod(LIMITE_REPETICIONES, len(momentos))
+            for i, momento in enumerate(momentos):
+                cupos[momento][plato['id']] = base + (1 if i < extra else 0)
+        return cupos
+    
+    def _generar_momento_semana(self, momento, presupuesto_momento, preferencias_tipo,
+                                preferencias_categoria, cupos, ultimos_tipos):
+        """
+        Genera los 7 días de un momento con su propio tracking de repeticiones
+        
+        Los cupos solo limitan qué platos son candidatos; el conteo de
+        platos_usados (que penaliza la variedad en el scoring) parte de cero.
+        
+        Returns:
+            Tuple (platos de cada día, tipos recientes al terminar la semana)
+        """
+        platos_usados = defaultdict(int)
+        ultimos_tipos = list(ultimos_tipos)
+        dias = []
+        
+        for idx_dia in range(len(DIAS_SEMANA)):
+            platos_momento = self._seleccionar_platos_ml(
+                momento=momento,
+                presupuesto=presupuesto_momento,
+                preferencias_tipo=preferencias_tipo,
+                preferencias_categoria=preferencias_categoria,
+                platos_usados=platos_usados,
+                ultimos_tipos=ultimos_tipos,
+                dia_semana=idx_dia,
+                cupos=cupos
+            )
+            self._registrar_seleccion(platos_momento, platos_usados, ultimos_tipos)
+            dias.append(platos_momento)
+        
+        return dias, ultimos_tipos
+    
+    def _generar_menu_semanal_paralelo(self, presupuesto, preferencias_tipo,
+                                       preferencias_categoria, estado, procesos=None):
+        """
+        Genera la semana particionada por momento del día en procesos paralelos.
+        
+        Cada momento ya lleva sus propios tipos recientes; lo único compartido
+        es el límite de repeticiones, que se reparte de antemano entre los
+        momentos (ver _cupos_por_momento). Así cada plato sigue apareciendo
+        como máximo LIMITE_REPETICIONES veces en la semana.
+        """
+        presupuesto_diario = presupuesto / 7
+        cupos = self._cupos_por_momento()
+        momentos = list(DISTRIBUCION_MOMENTOS.items())
+        
+        resultados = map_en_procesos(
+            lambda tarea: self._generar_momento_semana(
+                tarea[0], presupuesto_diario * tarea[1],
+                preferencias_tipo, preferencias_categoria,
+                cupos[tarea[0]], estado['ultimos_tipos'][tarea[0]]
+            ),
+            momentos,
+            procesos
+        )
+        
+        menu_semanal = {}
+        for idx_dia, dia in enumerate(DIAS_SEMANA):
+            menu_semanal[dia] = {
+                momento: dias[idx_dia]
+                for (momento, _), (dias, _) in zip(momentos, resultados)
+            }
+        
+        for (momento, _), (_, ultimos_tipos) in zip(momentos, resultados):
+            estado['ultimos_tipos'][momento] = ultimos_tipos
         
         return menu_semanal
     
     def _seleccionar_platos_ml(self, momento, presupuesto, preferencias_tipo, 
-                               preferencias_categoria, platos_usados, ultimos_tipos, dia_semana):
-        """Selección de platos usando scoring ML - Prioriza presupuesto sobre preferencias"""
+                               preferencias_categoria, platos_usados, ultimos_tipos, dia_semana,
+                               carrito=None, cupos=None):
+        """
+        Selección de platos usando scoring ML - Prioriza presupuesto sobre preferencias
+        
+        Con `carrito` (CarritoCompras de la semana) el precio que se compara
+        con el presupuesto es el costo marginal de compra de cada candidato.
+        Con `cupos` (plato_id -> máximo de usos) el límite de repeticiones
+        de esos platos es su cupo en lugar de LIMITE_REPETICIONES.
+        """
         platos_seleccionados = {}
         
         # Definir componentes por momento
@@ -134,25 +489,27 @@ class MenuMLLite:
         
         for componente, porcentaje_presupuesto in componentes:
             presupuesto_componente = presupuesto * porcentaje_presupuesto
+            if carrito is not None:
+                limite_carrito = carrito.limite(presupuesto_componente)
             
             # PASO 1: Intentar con preferencias
             candidatos = self._obtener_candidatos(
                 momento, componente, presupuesto_componente,
-                preferencias_tipo, preferencias_categoria, platos_usados
+                preferencias_tipo, preferencias_categoria, platos_usados, cupos
             )
             
             # PASO 2: Si no hay candidatos, ignorar preferencias de categoría
             if not candidatos and preferencias_categoria:
                 candidatos = self._obtener_candidatos(
                     momento, componente, presupuesto_componente,
-                    preferencias_tipo, [], platos_usados
+                    preferencias_tipo, [], platos_usados, cupos
                 )
             
             # PASO 3: Si no hay candidatos, ignorar todas las preferencias
             if not candidatos:
                 candidatos = self._obtener_candidatos(
                     momento, componente, presupuesto_componente,
-                    [], [], platos_usados
+                    [], [], platos_usados, cupos
                 )
             
             # PASO 4: Si es bebida y no hay candidatos, buscar la más barata
@@ -168,19 +525,33 @@ class MenuMLLite:
                 candidatos = self._obtener_plato_economico(momento, componente)
             
             if candidatos:
+                presupuesto_max = presupuesto_componente
+                costos = None
+                if carrito is not None:
+                    candidatos, costos, presupuesto_max = carrito.filtrar(candidatos, limite_carrito)
+                
                 # Calcular scores ML para cada candidato
-                scores_candidatos = []
-                for plato in candidatos:
-                    score = self._calcular_score_ml(
-                        plato, presupuesto_componente, platos_usados,
-                        ultimos_tipos, dia_semana
+                if self.vectorizado:
+                    scores_candidatos = self._calcular_scores_vectorizado(
+                        candidatos, presupuesto_max, platos_usados,
+                        ultimos_tipos, dia_semana, costos=costos
                     )
-                    scores_candidatos.append((score, plato))
+                else:
+                    scores_candidatos = []
+                    for i, plato in enumerate(candidatos):
+                        score = self._calcular_score_ml(
+                            plato, presupuesto_max, platos_usados,
+                            ultimos_tipos, dia_semana,
+                            costo=costos[i] if costos is not None else None
+                        )
+                        scores_candidatos.append((score, plato))
                 
                 # Seleccionar usando distribución de probabilidad
                 mejor_plato = self._seleccionar_por_probabilidad(scores_candidatos)
                 
                 if mejor_plato:
+                    if carrito is not None:
+                        carrito.agregar(mejor_plato)
                     if componente == 'principal':
                         platos_seleccionados['principal'] = mejor_plato
                     else:
@@ -188,25 +559,25 @@ class MenuMLLite:
         
         return platos_seleccionados
     
-    def _calcular_score_ml(self, plato, presupuesto_max, platos_usados, ultimos_tipos, dia_semana):
-        """Calcula score ML multi-factor para un plato"""
+    def _calcular_score_ml(self, plato, presupuesto_max, platos_usados, ultimos_tipos, dia_semana,
+                           costo=None):
+        """
+        Calcula score ML multi-factor para un plato
+        
+        Args:
+            costo: Costo marginal de compra; por defecto el precio del plato para 2
+        """
         scores = {}
         
         # 1. Score de precio (invertido - más barato es mejor)
-        precio_para_dos = plato['precio'] * 2
+        precio_para_dos = plato['precio'] * 2 if costo is None else costo
         if precio_para_dos <= presupuesto_max:
             scores['precio'] = 1 - (precio_para_dos / presupuesto_max)
         else:
             return 0  # Fuera de presupuesto
         
         # 2. Score de calorías (preferir rango saludable)
-        calorias = plato['calorias']
-        if 200 <= calorias <= 400:
-            scores['calorias'] = 1.0
-        elif 150 <= calorias <= 500:
-            scores['calorias'] = 0.7
-        else:
-            scores['calorias'] = 0.4
+        scores['calorias'] = self._score_calorias(plato['calorias'])
         
         # 3. Score de variedad (penalizar repeticiones)
         repeticiones = platos_usados.get(plato['id'], 0)
@@ -235,7 +606,7 @@ class MenuMLLite:
         # Bonus contextual
         # Fin de semana: permitir platos más elaborados
         if dia_semana >= 5:  # Sábado o Domingo
-            if plato.get('tipo') in ['criolla', 'marina']:
+            if plato.get('tipo') in TIPOS_FIN_DE_SEMANA:
                 score_final *= 1.1
         
         # Añadir algo de aleatoriedad para variedad
@@ -243,6 +614,76 @@ class MenuMLLite:
         
         return score_final
     
+    @staticmethod
+    def _score_calorias(calorias):
+        """Score de calorías: preferir rango saludable"""
+        if 200 <= calorias <= 400:
+            return 1.0
+        elif 150 <= calorias <= 500:
+            return 0.7
+        return 0.4
+    
+    def _calcular_scores_vectorizado(self, candidatos, presupuesto_max, platos_usados,
+                                     ultimos_tipos, dia_semana, top=5, costos=None):
+        """
+        Calcula el mismo score multi-factor que _calcular_score_ml para todos
+        los candidatos de un slot con operaciones sobre columnas numpy.
+        
+        Args:
+            costos: Costos marginales de compra alineados con `candidatos`;
+                    por defecto el precio de cada plato para 2
+        
+        Returns:
+            Lista de (score, plato) con los `top` mejores candidatos
+        """
+        idx = np.fromiter(
+            (self.posicion_por_id[p['id']] for p in candidatos), dtype=np.int64, count=len(candidatos)
+        )
+        repeticiones = np.fromiter(
+            (platos_usados.get(p['id'], 0) for p in candidatos), dtype=np.int64, count=len(candidatos)
+        )
+        tipos = self.col_tipo[idx]
+        
+        # 1. Precio (invertido - más barato es mejor)
+        if costos is None:
+            precio_para_dos = self.col_precio[idx] * 2
+        else:
+            precio_para_dos = np.asarray(costos, dtype=np.float64)
+        dentro_presupuesto = precio_para_dos <= presupuesto_max
+        with np.errstate(divide='ignore', invalid='ignore'):
+            score_precio = 1 - precio_para_dos / presupuesto_max
+        
+        # 3. Variedad (penalizar repeticiones)
+        score_variedad = np.where(repeticiones == 0, 1.0, np.where(repeticiones == 1, 0.3, 0.1))
+        
+        # 5. Novedad (bonus para tipos no recientes)
+        codigos_recientes = [self.codigo_tipo[str(t)] for t in ultimos_tipos if str(t) in self.codigo_tipo]
+        score_novedad = np.where(np.isin(tipos, codigos_recientes), 0.3, 1.0)
+        
+        scores = (
+            score_precio * self.pesos['precio']
+            + self.col_calorias[idx] * self.pesos['calorias']
+            + score_variedad * self.pesos['variedad']
+            + self.col_popularidad[idx] * self.pesos['popularidad']
+            + score_novedad * self.pesos['novedad']
+        )
+        
+        # Bonus contextual de fin de semana
+        if dia_semana >= 5:
+            scores = np.where(self.col_fin_de_semana[idx], scores * 1.1, scores)
+        
+        # Aleatoriedad para variedad; fuera de presupuesto el score es 0
+        scores = scores * np.random.uniform(0.9, 1.1, size=len(candidatos))
+        scores = np.where(dentro_presupuesto, scores, 0.0)
+        
+        # Solo los mejores pasan a la selección probabilística
+        if len(candidatos) > top:
+            mejores = np.argpartition(-scores, top)[:top]
+        else:
+            mejores = np.arange(len(candidatos))
+        
+        return [(float(scores[i]), candidatos[i]) for i in mejores]
+    
     def _seleccionar_por_probabilidad(self, scores_candidatos):
         """Selecciona un plato usando distribución de probabilidad basada en scores"""
         if not scores_candidatos:
@@ -270,89 +711,68 @@ class MenuMLLite:
         return top_candidatos[0][1]  # Fallback al mejor
     
     def _obtener_candidatos(self, momento, componente, presupuesto_max,
-                           pref_tipo, pref_cat, platos_usados):
-        """Obtiene platos candidatos filtrados"""
-        candidatos = []
-        
-        for plato in self.platos_data:
-            # Filtro por momento del día
-            if momento not in plato.get('momento_dia', []):
-                continue
-            
-            # Filtro por componente
-            if componente == 'principal':
-                if plato['componente'] not in ['sandwich', 'fondo']:
-                    continue
-            elif plato['componente'] != componente:
-                continue
-            
-            # Filtro por preferencias
-            if pref_tipo and plato['tipo'] not in pref_tipo:
-                continue
-            
-            if pref_cat and plato['categoria'] not in pref_cat:
-                continue
-            
-            # Filtro por presupuesto
-            if plato['precio'] * 2 > presupuesto_max:
-                continue
-            
+                           pref_tipo, pref_cat, platos_usados, cupos=None):
+        """Obtiene platos candidatos filtrados usando el índice por precio"""
+        cupos = cupos or {}
+        # precio * 2 <= presupuesto_max  <=>  precio <= presupuesto_max / 2
+        candidatos = [
+            plato for plato in self._platos_hasta_precio(
+                momento, componente, presupuesto_max / 2, pref_tipo, pref_cat
+            )
             # Limitar repeticiones extremas
-            if platos_usados.get(plato['id'], 0) >= 3:
-                continue
-            
-            candidatos.append(plato)
+            if platos_usados.get(plato['id'], 0) < cupos.get(plato['id'], LIMITE_REPETICIONES)
+        ]
         
         # Si no hay candidatos y el presupuesto es muy bajo, flexibilizar
         if not candidatos and presupuesto_max < 5:
-            # Aumentar tolerancia de presupuesto para platos muy baratos
-            for plato in self.platos_data:
-                if momento not in plato.get('momento_dia', []):
-                    continue
-                
-                if componente == 'principal':
-                    if plato['componente'] not in ['sandwich', 'fondo']:
-                        continue
-                elif plato['componente'] != componente:
-                    continue
-                
-                # Permitir hasta 20% más del presupuesto para platos muy baratos
-                if plato['precio'] * 2 <= presupuesto_max * 1.2:
-                    candidatos.append(plato)
+            # Permitir hasta 20% más del presupuesto para platos muy baratos
+            candidatos = list(self._platos_hasta_precio(
+                momento, componente, presupuesto_max * 1.2 / 2
+            ))
         
         return candidatos
     
     def _obtener_bebida_economica(self, momento):
         """Obtiene la bebida más económica disponible para el momento"""
-        bebidas = []
-        for plato in self.platos_data:
-            if (plato['componente'] == 'bebida' and 
-                momento in plato.get('momento_dia', [])):
-                bebidas.append(plato)
-        
-        # Ordenar por precio y devolver las 3 más baratas
-        return sorted(bebidas, key=lambda x: x['precio'])[:3]
+        # Devolver las 3 más baratas
+        return self._mas_baratos(momento, ['bebida'], 3)
     
     def _obtener_plato_economico(self, momento, componente):
         """Obtiene el plato más económico del componente para el momento"""
-        platos = []
-        for plato in self.platos_data:
-            if (plato['componente'] == componente and 
-                momento in plato.get('momento_dia', [])):
-                platos.append(plato)
+        componentes = [componente]
         
         # Si es para desayuno y buscamos 'fondo', buscar también 'sandwich'
         if momento == 'desayuno' and componente == 'fondo':
-            for plato in self.platos_data:
-                if (plato['componente'] == 'sandwich' and 
-                    momento in plato.get('momento_dia', [])):
-                    platos.append(plato)
+            componentes.append('sandwich')
         
-        # Ordenar por precio y devolver los 5 más baratos
-        return sorted(platos, key=lambda x: x['precio'])[:5]
+        # Devolver los 5 más baratos
+        return self._mas_baratos(momento, componentes, 5)
     
-    def retroalimentar(self, menu_id, satisfaccion):
-        """Actualiza el modelo con retroalimentación del usuario"""
-        # En producción, esto actualizaría la base de datos
-        # y re-entrenaría el modelo periódicamente
-        print(f"Retroalimentación recibida: Menu {menu_id}, Satisfacción: {satisfaccion}%")
\ No newline at end of file
+    def retroalimentar(self, platos_ids, satisfaccion):
+        """
+        Actualiza el modelo con retroalimentación del usuario
+        
+        Solo recalcula las features de los platos valorados, salvo que cambie
+        el máximo de selecciones (entonces se renormaliza todo el catálogo).
+        
+        Args:
+            platos_ids: Ids de los platos del menú valorado (con repeticiones)
+            satisfaccion: Valoración del menú (0-100)
+        """
+        max_anterior = max(self.historial_selecciones.values()) if self.historial_selecciones else 0
+        for plato_id in platos_ids:
+            self._acumular(plato_id, satisfaccion)
+        
+        max_selecciones = max(self.historial_selecciones.values()) if self.historial_selecciones else 1
+        if max_selecciones != max_anterior:
+            self._calcular_popularidad()
+        else:
+            for plato_id in set(platos_ids):
+                if plato_id not in self.platos_por_id:
+                    continue
+                features = self._features_plato(plato_id, max_selecciones)
+                self.features_cache[plato_id] = features
+                if self.vectorizado:
+                    self.col_popularidad[self.posicion_por_id[plato_id]] = features['popularidad']
+        
+        print(f"Retroalimentación recibida: {len(platos_ids)} platos, Satisfacción: {satisfaccion}%")
\ No newline at end of file
@@ -0,0 +1,561 @@
+import os
+import math
+import time
+from collections import defaultdict
+from ml_model_lite import DIAS_SEMANA, GRUPOS_COMPONENTE, LIMITE_REPETICIONES
+
+# numpy es opcional: sin él se usa siempre la heurística
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Componentes de cada momento y el componente real del catálogo que los cubre
+COMPONENTES_MOMENTO = {
+    'desayuno': [('bebida', ('bebida',)), ('principal', GRUPOS_COMPONENTE['principal'])],
+    'almuerzo': [('bebida', ('bebida',)), ('entrada', ('entrada',)), ('fondo', ('fondo',))],
+    'cena': [('bebida', ('bebida',)), ('entrada', ('entrada',)), ('fondo', ('fondo',))]
+}
+
+# Componentes que pueden quedar vacíos algún día
+COMPONENTES_OPCIONALES = ('entrada',)
+
+# Factor de variedad de la 1a, 2a, 3a... aparición de un plato (igual que el scoring)
+FACTORES_VARIEDAD = (1.0, 0.3, 0.1)
+
+# Tamaño máximo de la tabla de presupuesto (la resolución se adapta al presupuesto).
+# Junto con CANDIDATOS_MAX acota el costo del DP sin importar el tamaño del catálogo
+UNIDADES_MAX = 200
+
+# Candidatos por grupo que entran al DP (los de mayor utilidad)
+CANDIDATOS_MAX = 12
+
+TIEMPO_MAX_MS = float(os.environ.get('OPTIMIZADOR_TIEMPO_MS', 50))
+
+# Pasadas de costeo: la primera reparte los ingredientes por presentación entre
+# todos los candidatos, la siguiente entre los platos que eligió la anterior
+PASADAS_COSTEO = 2
+
+# Calorías por persona y día (promedio de la semana) que debe cumplir el menú
+CALORIAS_DIA_MIN = float(os.environ.get('OPTIMIZADOR_CALORIAS_MIN', 1200))
+CALORIAS_DIA_MAX = float(os.environ.get('OPTIMIZADOR_CALORIAS_MAX', 2800))
+
+# Veces que se agotó el tiempo en este contenedor (solo se registra cada tanto)
+_agotados = 0
+
+class PresupuestoAgotado(Exception):
+    """El optimizador superó su presupuesto de tiempo"""
+
+class OptimizadorMenu:
+    """
+    Selección conjunta de toda la semana bajo el presupuesto total
+    
+    Cada grupo (momento, componente) tiene 7 slots. Primero se resuelve por
+    grupo una mochila acotada con cardinalidad (qué platos y cuántas veces)
+    para cada presupuesto posible, y luego se combinan los grupos con un DP
+    sobre el presupuesto total (mochila de elección múltiple). La utilidad
+    usa los mismos factores que el scoring de MenuMLLite; el precio premia
+    aprovechar el presupuesto.
+    
+    Con los costos de compra del modelo (MenuMLLite.usar_catalogo) la
+    primera porción de un plato paga su parte de los ingredientes por
+    presentación y las siguientes solo la parte por unidad, y el menú se
+    valida contra la lista de compras real; sin ellos se usa el precio del
+    plato. El menú además debe quedar dentro del rango de calorías diarias
+    (CALORIAS_DIA_MIN..CALORIAS_DIA_MAX por persona).
+    """
+    
+    def __init__(self, modelo, tiempo_max_ms=None):
+        self.modelo = modelo
+        self.tiempo_max = (TIEMPO_MAX_MS if tiempo_max_ms is None else tiempo_max_ms) / 1000
+    
+    def generar(self, presupuesto, preferencias_tipo=None, preferencias_categoria=None):
+        """
+        Genera el menú semanal óptimo
+        
+        Returns:
+            Dict dia -> momento -> componente -> plato, o None si no hay
+            solución factible o se agotó el tiempo (usar la heurística)
+        """
+        global _agotados
+        if np is None:
+            return None
+        
+        inicio = time.perf_counter()
+        dias = len(DIAS_SEMANA)
+        costos = self.modelo.costos_compras
+        
+        grupos = []
+        try:
+            for momento, componentes in COMPONENTES_MOMENTO.items():
+                for componente, reales in componentes:
+                    candidatos = self._candidatos(
+                        momento, reales, preferencias_tipo, preferencias_categoria
+                    )
+                    grupos.append((
+                        momento, componente, componente in COMPONENTES_OPCIONALES,
+                        self._preseleccionar(candidatos, dias)
+                    ))
+            
+            cupos = self._repartir_cupos(grupos, dias)
+            if cupos is None:
+                return None
+            
+            # Cada pasada vuelve a costear con los platos que eligió la anterior,
+            # así el costo del DP coincide con el del carrito para ese menú
+            mejor = None
+            referencia = None
+            for _ in range(PASADAS_COSTEO if costos is not None else 1):
+                costeados = self._costear(grupos, costos, referencia)
+                resuelto = self._resolver(costeados, cupos, presupuesto, dias, inicio)
+                if resuelto is None:
+                    break
+                hallado, referencia = self._ajustar_tope(
+                    costeados, resuelto, presupuesto, costos, dias
+                )
+                if hallado is not None and (mejor is None or hallado[0] > mejor[0]):
+                    mejor = hallado
+                if referencia is None:
+                    break
+            
+            return mejor[1] if mejor is not None else None
+        except PresupuestoAgotado:
+            _agotados += 1
+            if _agotados == 1 or _agotados % 100 == 0:
+                print(f"Optimizador sin tiempo ({self.tiempo_max * 1000:.0f} ms, "
+                      f"{_agotados} veces), se usa la heurística")
+        
+        return None
+    
+    def _resolver(self, grupos, cupos, presupuesto, dias, inicio):
+        """
+        Resuelve los grupos y su combinación para todo presupuesto hasta el total
+        
+        Returns:
+            Tuple (tablas por grupo, utilidad combinada por presupuesto,
+            decisiones de la combinación, unidades del presupuesto total),
+            o None si algún grupo no puede llenarse
+        """
+        # La resolución se adapta para que la tabla no pase de UNIDADES_MAX
+        resolucion = max(0.5, presupuesto / UNIDADES_MAX)
+        unidades = int(presupuesto / resolucion)
+        
+        tablas = []
+        for (_, _, opcional, elegidos), cupos_grupo in zip(grupos, cupos):
+            tabla = self._resolver_grupo(
+                elegidos, cupos_grupo, dias, unidades, resolucion, opcional, inicio
+            )
+            if tabla is None:
+                return None
+            tablas.append(tabla)
+        
+        acumulado, decisiones = self._combinar([tabla[0] for tabla in tablas], unidades, inicio)
+        return tablas, acumulado, decisiones, unidades
+    
+    def _ajustar_tope(self, grupos, resuelto, presupuesto, costos, dias):
+        """
+        Mayor presupuesto interno cuyo menú entra en el presupuesto real
+        
+        Los costos por plato son una estimación (los ingredientes compartidos
+        se pagan una sola vez), así que se busca por bisección entre el menor
+        tope factible y el que se pasa. Las tablas valen para cualquier tope
+        y la utilidad combinada no decrece con él, por lo que solo se vuelve
+        a recorrer la combinación.
+        
+        Returns:
+            Tuple ((utilidad, menú) del mejor menú válido o None, menú del
+            tope máximo para costear la pasada siguiente; (None, None) si
+            ningún presupuesto tiene combinación factible
+        """
+        tablas, acumulado, decisiones, unidades = resuelto
+        
+        def evaluar(tope):
+            menu_semanal = self._armar(grupos, tablas, self._asignar(acumulado, decisiones, tope), dias)
+            real = self._costo_compras(menu_semanal, costos) if costos is not None else 0.0
+            return menu_semanal, real <= presupuesto
+        
+        validos = []
+        
+        def registrar(tope, menu_semanal):
+            if self._calorias_en_rango(menu_semanal):
+                validos.append((float(acumulado[tope]), menu_semanal))
+        
+        factibles = np.flatnonzero(np.isfinite(acumulado))
+        if not len(factibles):
+            return None, None
+        
+        alto = unidades
+        menu_alto, entra = evaluar(alto)
+        if entra:
+            registrar(alto, menu_alto)
+        else:
+            bajo = int(factibles[0])
+            menu_bajo, entra = evaluar(bajo)
+            if entra:
+                registrar(bajo, menu_bajo)
+                # Invariante: bajo entra, alto se pasa
+                while alto - bajo > 1:
+                    medio = (bajo + alto) // 2
+                    menu_medio, entra = evaluar(medio)
+                    if entra:
+                        bajo = medio
+                        registrar(medio, menu_medio)
+                    else:
+                        alto = medio
+        
+        mejor = max(validos, key=lambda v: v[0]) if validos else None
+        return mejor, menu_alto
+    
+    def _calorias_en_rango(self, menu_semanal):
+        """Promedio diario de calorías por persona dentro del rango objetivo"""
+        total = sum(
+            plato['calorias']
+            for momentos in menu_semanal.values()
+            for platos in momentos.values()
+            for plato in platos.values()
+        )
+        return CALORIAS_DIA_MIN <= total / len(menu_semanal) <= CALORIAS_DIA_MAX
+    
+    def _armar(self, grupos, tablas, gastos, dias):
+        """Menú semanal con el presupuesto asignado a cada grupo"""
+        menu_semanal = {
+            dia: {momento: {} for momento in COMPONENTES_MOMENTO} for dia in DIAS_SEMANA
+        }
+        for (momento, componente, _, _), tabla, gasto in zip(grupos, tablas, gastos):
+            platos = self._reconstruir(tabla, gasto)
+            for dia, plato in zip(DIAS_SEMANA, self._repartir(platos, dias)):
+                if plato is not None:
+                    menu_semanal[dia][momento][componente] = plato
+        return menu_semanal
+    
+    def _verificar_tiempo(self, inicio):
+        if time.perf_counter() - inicio > self.tiempo_max:
+            raise PresupuestoAgotado()
+    
+    def _candidatos(self, momento, reales, pref_tipo, pref_cat):
+        """Candidatos del grupo relajando preferencias como la heurística"""
+        for tipos, categorias in ((pref_tipo, pref_cat), (pref_tipo, []), ([], [])):
+            candidatos = [
+                plato
+                for componente in reales
+                for plato in self.modelo._platos_hasta_precio(
+                    momento, componente, float('inf'), tipos, categorias
+                )
+            ]
+            if candidatos:
+                return candidatos
+        return []
+    
+    def _utilidades(self, candidatos):
+        """Utilidad de cada candidato sin el factor de variedad (que depende de la copia)"""
+        pesos = self.modelo.pesos
+        if self.modelo.vectorizado:
+            posiciones = np.fromiter(
+                (self.modelo.posicion_por_id[p['id']] for p in candidatos),
+                dtype=np.int64, count=len(candidatos)
+            )
+            precios = self.modelo.col_precio[posiciones]
+            utilidades = (
+                precios / precios.max() * pesos['precio']
+                + self.modelo.col_calorias[posiciones] * pesos['calorias']
+                + self.modelo.col_popularidad[posiciones] * pesos['popularidad']
+            )
+        else:
+            precio_max = max(p['precio'] for p in candidatos)
+            utilidades = np.array([
+                p['precio'] / precio_max * pesos['precio']
+                + self.modelo._score_calorias(p['calorias']) * pesos['calorias']
+                + self.modelo.features_cache.get(p['id'], {}).get('popularidad', 0.5) * pesos['popularidad']
+                for p in candidatos
+            ])
+        # Algo de aleatoriedad para que dos peticiones iguales no den el mismo menú
+        return utilidades * np.random.uniform(0.9, 1.1, size=len(candidatos))
+    
+    def _preseleccionar(self, candidatos, dias):
+        """
+        Candidatos que entran al DP: los de mayor utilidad y siempre los más
+        baratos, para garantizar factibilidad
+        
+        Returns:
+            Lista de (utilidad, plato) ordenada por utilidad
+        """
+        if not candidatos:
+            return []
+        
+        utilidades = self._utilidades(candidatos)
+        precios = np.array([p['precio'] for p in candidatos])
+        elegidos = set(np.argsort(-utilidades)[:CANDIDATOS_MAX].tolist())
+        elegidos.update(np.argsort(precios, kind='stable')[:dias].tolist())
+        orden = sorted(elegidos, key=lambda i: -utilidades[i])
+        return [(float(utilidades[i]), candidatos[i]) for i in orden]
+    
+    def _costear(self, grupos, costos, referencia=None):
+        """
+        Agrega a cada candidato el costo de su primera porción y de repetirlo
+        
+        Con costos de compra, cada ingrediente que se paga por presentación
+        se reparte entre los platos que lo usan: sin `referencia`, entre
+        todos los candidatos de la semana; con el menú de una pasada
+        anterior, entre sus platos (y el candidato, si no está en él). Así
+        el costo de los platos de la referencia suma exactamente lo que
+        cobra su carrito. Sin costos se usa el precio del plato para 2.
+        
+        Returns:
+            Grupos con elegidos como (utilidad, plato, primera, repetición)
+        """
+        if costos is None:
+            return [
+                (momento, componente, opcional, [
+                    (utilidad, plato, plato['precio'] * 2, plato['precio'] * 2)
+                    for utilidad, plato in elegidos
+                ])
+                for momento, componente, opcional, elegidos in grupos
+            ]
+        
+        posiciones = {
+            plato['id']: costos.posicion_por_id[plato['id']]
+            for _, _, _, elegidos in grupos for _, plato in elegidos
+        }
+        if referencia is None:
+            usados = set(posiciones)
+        else:
+            usados = {
+                plato['id']
+                for momentos in referencia.values()
+                for platos in momentos.values()
+                for plato in platos.values()
+            }
+            posiciones.update((plato_id, costos.posicion_por_id[plato_id]) for plato_id in usados)
+        
+        usuarios = defaultdict(int)
+        for plato_id in usados:
+            for indice in costos.ingredientes_fijos[posiciones[plato_id]]:
+                usuarios[indice] += 1
+        
+        costeados = []
+        for momento, componente, opcional, elegidos in grupos:
+            filas = []
+            for utilidad, plato in elegidos:
+                posicion = posiciones[plato['id']]
+                propio = 0 if plato['id'] in usados else 1
+                repeticion = float(costos.repeticion[posicion])
+                primera = repeticion + sum(
+                    costos.fijo[indice] / (usuarios[indice] + propio)
+                    for indice in costos.ingredientes_fijos[posicion]
+                )
+                filas.append((utilidad, plato, primera, repeticion))
+            costeados.append((momento, componente, opcional, filas))
+        return costeados
+    
+    def _repartir_cupos(self, grupos, dias):
+        """
+        Reparte el límite semanal de repeticiones de cada plato entre los
+        grupos donde es candidato (p. ej. una bebida de almuerzo y cena)
+        
+        Se parte de un reparto parejo y se mueve cupo hacia los grupos que
+        no llegan a cubrir la semana desde los que les sobra, sin pasar
+        nunca LIMITE_REPETICIONES en total.
+        
+        Returns:
+            Lista con un dict plato_id -> cupo por grupo, o None si el
+            catálogo no alcanza para cubrir la semana sin repetir de más
+        """
+        cupos = [{} for _ in grupos]
+        grupos_por_plato = defaultdict(list)
+        for g, (_, _, _, elegidos) in enumerate(grupos):
+            for _, plato in elegidos:
+                grupos_por_plato[plato['id']].append(g)
+        
+        for plato_id, indices in grupos_por_plato.items():
+            base, extra = divmod(LIMITE_REPETICIONES, len(indices))
+            for i, g in enumerate(indices):
+                cupos[g][plato_id] = base + (1 if i < extra else 0)
+        
+        capacidad = [sum(c.values()) for c in cupos]
+        opcionales = [opcional for _, _, opcional, _ in grupos]
+        
+        for g in range(len(grupos)):
+            if opcionales[g] or capacidad[g] >= dias:
+                continue
+            # Primero de grupos obligatorios con sobra, después de las entradas
+            for desde_opcionales in (False, True):
+                for plato_id in cupos[g]:
+                    for h in grupos_por_plato[plato_id]:
+                        if h == g or opcionales[h] != desde_opcionales:
+                            continue
+                        while (capacidad[g] < dias and cupos[h][plato_id] > 0
+                               and (opcionales[h] or capacidad[h] > dias)):
+                            cupos[h][plato_id] -= 1
+                            capacidad[h] -= 1
+                            cupos[g][plato_id] += 1
+                            capacidad[g] += 1
+            if capacidad[g] < dias:
+                return None
+        
+        return cupos
+    
+    def _resolver_grupo(self, elegidos, cupos, dias, unidades, resolucion, opcional, inicio):
+        """
+        Mochila acotada con cardinalidad para los 7 slots de un grupo
+        
+        Cada plato se elige 0..cupo veces como una sola decisión, así el
+        costo de la primera porción siempre se paga antes que el de repetir.
+        
+        Returns:
+            Tuple (mejor utilidad por presupuesto, datos para reconstruir) o
+            None si el grupo no puede llenarse
+        """
+        if not elegidos:
+            return None if not opcional else (np.zeros(unidades + 1), None)
+        
+        peso_variedad = self.modelo.pesos['variedad']
+        
+        # dp[k, c]: mejor utilidad con k platos y costo exacto c
+        dp = np.full((dias + 1, unidades + 1), -np.inf)
+        dp[0, 0] = 0.0
+        eleccion = np.zeros((len(elegidos), dias + 1, unidades + 1), dtype=np.int8)
+        costos_por_copias = []
+        for j, (utilidad, plato, primera, repeticion) in enumerate(elegidos):
+            nuevo = dp.copy()
+            costos_plato = [0]
+            costo_total = 0.0
+            utilidad_total = 0.0
+            for copias in range(1, min(cupos.get(plato['id'], 0), dias) + 1):
+                costo_total += primera if copias == 1 else repeticion
+                factor = FACTORES_VARIEDAD[min(copias - 1, len(FACTORES_VARIEDAD) - 1)]
+                utilidad_total += utilidad + peso_variedad * factor
+                costo = math.ceil(round(costo_total / resolucion, 6))
+                if costo > unidades:
+                    break
+                costos_plato.append(costo)
+                
+                anterior = dp[:-copias, :unidades + 1 - costo] + utilidad_total
+                destino = nuevo[copias:, costo:]
+                mejora = anterior > destino
+                np.copyto(destino, anterior, where=mejora)
+                np.copyto(eleccion[j, copias:, costo:], copias, where=mejora)
+            dp = nuevo
+            costos_por_copias.append(costos_plato)
+            if j % 8 == 0:
+                self._verificar_tiempo(inicio)
+        
+        # Con entradas opcionales vale cualquier cantidad de platos
+        if opcional:
+            cantidades = dp.argmax(axis=0)
+            por_costo = dp[cantidades, np.arange(unidades + 1)]
+        else:
+            cantidades = np.full(unidades + 1, dias)
+            por_costo = dp[dias]
+        
+        # Mejor utilidad con costo <= c y el costo donde se alcanza
+        mejor = np.maximum.accumulate(por_costo)
+        mejor_costo = np.maximum.accumulate(
+            np.where(por_costo >= mejor, np.arange(unidades + 1), 0)
+        )
+        
+        if not np.isfinite(mejor[-1]):
+            return None
+        
+        return mejor, (elegidos, eleccion, costos_por_copias, cantidades, mejor_costo)
+    
+    def _combinar(self, tablas, unidades, inicio):
+        """
+        Reparte el presupuesto entre grupos (max-plus sobre las tablas)
+        
+        Las tablas son escalonadas y no decrecientes, así que basta con
+        probar los costos donde cada grupo mejora su utilidad.
+        
+        Returns:
+            Tuple (mejor utilidad total por presupuesto, decisiones por grupo
+            para recorrer con _asignar)
+        """
+        acumulado = tablas[0]
+        decisiones = []
+        indices = np.arange(unidades + 1)
+        for tabla in tablas[1:]:
+            previo = np.concatenate(([-np.inf], tabla[:-1]))
+            escalones = np.flatnonzero(tabla > previo)
+            # total[e, c] = acumulado[c - escalones[e]] + tabla[escalones[e]]
+            resto = indices[None, :] - escalones[:, None]
+            total = np.where(
+                resto >= 0,
+                acumulado[np.maximum(resto, 0)] + tabla[escalones][:, None],
+                -np.inf
+            )
+            mejor = total.argmax(axis=0)
+            acumulado = total[mejor, indices]
+            decisiones.append(escalones[mejor])
+            self._verificar_tiempo(inicio)
+        
+        return acumulado, decisiones
+    
+    def _asignar(self, acumulado, decisiones, tope):
+        """
+        Presupuesto de cada grupo recorriendo las decisiones hacia atrás
+        
+        Returns:
+            Lista con el presupuesto asignado a cada grupo, o None si no hay
+            combinación factible con `tope` unidades
+        """
+        if tope < 0 or not np.isfinite(acumulado[tope]):
+            return None
+        
+        gastos = []
+        c = tope
+        for asignado in reversed(decisiones):
+            a = int(asignado[c])
+            gastos.append(a)
+            c -= a
+        gastos.append(c)
+        gastos.reverse()
+        return gastos
+    
+    def _reconstruir(self, tabla, gasto):
+        """Platos elegidos por un grupo para el presupuesto asignado"""
+        _, datos = tabla
+        if datos is None:
+            return []
+        elegidos, eleccion, costos_por_copias, cantidades, mejor_costo = datos
+        
+        c = int(mejor_costo[gasto])
+        k = int(cantidades[c])
+        platos = []
+        for j in range(len(elegidos) - 1, -1, -1):
+            if k == 0:
+                break
+            copias = int(eleccion[j, k, c])
+            if copias:
+                platos.extend([elegidos[j][1]] * copias)
+                c -= costos_por_copias[j][copias]
+                k -= copias
+        return platos
+    
+    def _repartir(self, platos, dias):
+        """
+        Ordena los platos del grupo en la semana separando las repeticiones
+        
+        Returns:
+            Lista de `dias` platos (None en los días sin plato)
+        """
+        conteo = {}
+        for plato in platos:
+            conteo.setdefault(plato['id'], []).append(plato)
+        
+        # Los más repetidos primero, en días alternos (0, 2, 4, 6, 1, 3, 5);
+        # los días sin plato (entradas opcionales) quedan al final
+        ordenados = [p for grupo in sorted(conteo.values(), key=len, reverse=True) for p in grupo]
+        total = len(ordenados)
+        posiciones = list(range(0, total, 2)) + list(range(1, total, 2))
+        semana = [None] * total
+        for posicion, plato in zip(posiciones, ordenados):
+            semana[posicion] = plato
+        return semana + [None] * (dias - total)
+    
+    def _costo_compras(self, menu_semanal, costos):
+        """Total real de la lista de compras del menú"""
+        carrito = costos.nuevo_carrito()
+        for momentos in menu_semanal.values():
+            for platos in momentos.values():
+                for plato in platos.values():
+                    carrito.agregar(plato)
+        return carrito.gastado
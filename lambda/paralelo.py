@@ -0,0 +1,89 @@
+import os
+import sys
+import pickle
+import random
+import traceback
+
+def procesos_disponibles():
+    """Número de procesos por defecto (PROCESOS_MAX o núcleos disponibles)"""
+    return int(os.environ.get('PROCESOS_MAX', os.cpu_count() or 1))
+
+def _trabajador(funcion, tareas, conexion):
+    """Punto de entrada de cada proceso hijo"""
+    # Los hijos heredan el estado aleatorio del padre: re-sembrar para no repetir resultados
+    random.seed()
+    # numpy solo se re-siembra si ya fue importado (no forzar su carga)
+    np = sys.modules.get('numpy')
+    if np is not None:
+        np.random.seed()
+    try:
+        try:
+            conexion.send((True, [funcion(tarea) for tarea in tareas]))
+        except Exception as e:
+            # La excepción viaja al padre para que la relance
+            try:
+                conexion.send((False, e))
+            except (pickle.PicklingError, TypeError, AttributeError):
+                conexion.send((False, RuntimeError(traceback.format_exc())))
+    finally:
+        conexion.close()
+
+def map_en_procesos(funcion, tareas, procesos=None):
+    """
+    Aplica `funcion` a cada tarea repartiendo el trabajo entre procesos hijos
+    
+    Usa multiprocessing.Process + Pipe con fork (Lambda no soporta Pool ni
+    Queue porque no dispone de /dev/shm). La función y sus datos se heredan
+    por fork, solo los resultados se serializan.
+    
+    Args:
+        funcion: Callable que recibe una tarea
+        tareas: Lista de tareas
+        procesos: Número de procesos; por defecto procesos_disponibles()
+        
+    Returns:
+        Lista de resultados en el mismo orden que las tareas
+        
+    Raises:
+        La excepción que haya lanzado `funcion` en algún hijo
+    """
+    if procesos is None:
+        procesos = procesos_disponibles()
+    procesos = max(1, min(procesos, len(tareas)))
+    
+    if procesos == 1:
+        return [funcion(tarea) for tarea in tareas]
+    
+    import multiprocessing
+    contexto = multiprocessing.get_context('fork')
+    tamano = -(-len(tareas) // procesos)
+    trabajos = []
+    for inicio in range(0, len(tareas), tamano):
+        padre, hijo = contexto.Pipe(duplex=False)
+        proceso = contexto.Process(
+            target=_trabajador,
+            args=(funcion, tareas[inicio:inicio + tamano], hijo)
+        )
+        proceso.start()
+        hijo.close()
+        trabajos.append((proceso, padre))
+    
+    resultados = []
+    error = None
+    for proceso, padre in trabajos:
+        try:
+            ok, valor = padre.recv()
+        except EOFError:
+            # El hijo murió sin enviar nada (p. ej. sin memoria)
+            ok, valor = False, None
+        proceso.join()
+        if not ok and error is None:
+            error = valor or RuntimeError(
+                f"El proceso hijo terminó sin resultado (código {proceso.exitcode})"
+            )
+        elif ok:
+            resultados.extend(valor)
+    
+    if error is not None:
+        raise error
+    return resultados
@@ -0,0 +1,39 @@
+import json
+import uuid
+from datetime import date, datetime, time
+from utils import decimal_default
+
+# orjson es opcional: si está instalado se usa como ruta rápida
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+BACKEND = 'orjson' if orjson is not None else 'json'
+
+def _default_json(obj):
+    """decimal_default más los tipos que orjson serializa de forma nativa"""
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    if isinstance(obj, (datetime, date, time)):
+        return obj.isoformat()
+    return decimal_default(obj)
+
+def dumps(obj):
+    """
+    Serializa a un string JSON compacto
+    
+    Los datos del pipeline ya llegan con floats (no Decimal), así que el
+    hook decimal_default solo actúa como red de seguridad.
+    """
+    if orjson is not None:
+        return orjson.dumps(
+            obj, default=decimal_default, option=orjson.OPT_NON_STR_KEYS
+        ).decode('utf-8')
+    return json.dumps(obj, default=_default_json, separators=(',', ':'))
+
+def loads(datos):
+    """Deserializa un string (o bytes) JSON"""
+    if orjson is not None:
+        return orjson.loads(datos)
+    return json.loads(datos)
@@ -8,78 +8,41 @@ def calcular_lista_compras(menu_semanal, db_connection):
     
     Args:
         menu_semanal: Dict con el menú de la semana
-        db_connection: Conexión a la base de datos
+        db_connection: Conexión a la base de datos o CatalogoIngredientes
         
     Returns:
         Dict con la lista de compras organizada por categorías
     """
-    ingredientes_totales = defaultdict(lambda: {
-        'cantidad': 0,
-        'unidad': '',
-        'precio_unitario': 0,
-        'categoria': 'otros'
-    })
+    if hasattr(db_connection, 'lineas_plato'):
+        # Ingredientes ya parseados y convertidos por el catálogo en memoria
+        ingredientes_totales = _totales_preconvertidos(menu_semanal, db_connection)
+    else:
+        ingredientes_totales = _totales_desde_json(menu_semanal, db_connection)
     
-    # Recopilar todos los ingredientes
-    for dia, momentos in menu_semanal.items():
-        for momento, platos in momentos.items():
-            for tipo, plato in platos.items():
-                if plato and 'ingredientes' in plato:
-                    try:
-                        # Los ingredientes vienen como JSON string
-                        ingredientes = json.loads(plato['ingredientes'])
-                        
-                        for ing in ingredientes:
-                            nombre = ing['ingrediente']
-                            cantidad = float(ing['cantidad'])
-                            unidad = ing['unidad']
-                            
-                            # Obtener información del ingrediente
-                            info_ing = db_connection.get_ingrediente_info(nombre)
-                            
-                            if info_ing:
-                                # Multiplicar por 2 (para 2 personas)
-                                cantidad_total = cantidad * 2
-                                
-                                # Convertir unidades si es necesario
-                                if unidad == 'g' and info_ing['unidad'] == 'kg':
-                                    cantidad_total = cantidad_total / 1000
-                                elif unidad == 'ml' and info_ing['unidad'] == 'litro':
-                                    cantidad_total = cantidad_total / 1000
-                                
-                                # Acumular cantidades
-                                ingredientes_totales[nombre]['cantidad'] += cantidad_total
-                                ingredientes_totales[nombre]['unidad'] = info_ing['unidad']
-                                ingredientes_totales[nombre]['precio_unitario'] = info_ing['precio']
-                                ingredientes_totales[nombre]['categoria'] = info_ing['categoria']
-                                ingredientes_totales[nombre]['venta_por'] = info_ing.get('venta_por', info_ing['unidad'])
-                                ingredientes_totales[nombre]['precio_venta'] = info_ing.get('precio_venta', info_ing['precio'])
-                    
-                    except (json.JSONDecodeError, KeyError) as e:
-                        print(f"Error procesando ingredientes de {plato.get('nombre', 'desconocido')}: {e}")
+    return organizar_lista_compras(ingredientes_totales)
+
+def organizar_lista_compras(ingredientes_totales):
+    """
+    Arma la lista de compras a partir de las cantidades totales
     
+    Args:
+        ingredientes_totales: Dict nombre -> cantidad, unidad, precio_unitario,
+                              categoria, venta_por y precio_venta
+        
+    Returns:
+        Dict con la lista de compras organizada por categorías
+    """
     # Organizar por categorías
     lista_por_categoria = defaultdict(list)
     total_general = 0
     
     for ingrediente, datos in ingredientes_totales.items():
         # Calcular cantidad a comprar y precio
-        cantidad_necesaria = datos['cantidad']
         precio_unitario = datos['precio_unitario']
-        
-        # Si se vende por unidad diferente, ajustar
-        if datos.get('precio_venta'):
-            precio_compra = datos['precio_venta']
-            # Ajustar cantidad según cómo se vende
-            if 'bolsa' in datos.get('venta_por', ''):
-                cantidad_compra = 1  # Comprar 1 bolsa
-            elif 'atado' in datos.get('venta_por', ''):
-                cantidad_compra = 1  # Comprar 1 atado
-            else:
-                cantidad_compra = cantidad_necesaria
-        else:
-            precio_compra = precio_unitario * cantidad_necesaria
-            cantidad_compra = cantidad_necesaria
+        cantidad_compra, precio_compra = calcular_compra(
+            datos['cantidad'], precio_unitario,
+            datos.get('venta_por', ''), datos.get('precio_venta')
+        )
         
         # Redondear cantidades
         cantidad_compra = round(cantidad_compra, 2)
@@ -121,6 +84,126 @@ def calcular_lista_compras(menu_semanal, db_connection):
         'categorias': dict(lista_por_categoria)
     }
 
+def calcular_compra(cantidad_necesaria, precio_unitario, venta_por, precio_venta):
+    """
+    Regla de compra de un ingrediente según cómo se vende
+    
+    Args:
+        cantidad_necesaria: Cantidad total en la unidad de compra
+        precio_unitario: Precio por unidad
+        venta_por: Forma de venta ('bolsa', 'atado', 'kg'...)
+        precio_venta: Precio de la presentación de venta (puede faltar)
+        
+    Returns:
+        Tuple (cantidad a comprar, precio a pagar) sin redondear
+    """
+    # Si se vende por unidad diferente, ajustar
+    if precio_venta:
+        # Ajustar cantidad según cómo se vende
+        if 'bolsa' in (venta_por or ''):
+            return 1, precio_venta  # Comprar 1 bolsa
+        if 'atado' in (venta_por or ''):
+            return 1, precio_venta  # Comprar 1 atado
+        return cantidad_necesaria, precio_venta
+    
+    return cantidad_necesaria, precio_unitario * cantidad_necesaria
+
+def _totales_preconvertidos(menu_semanal, catalogo):
+    """
+    Suma las cantidades por índice de ingrediente usando las líneas
+    precalculadas de cada plato (ya en unidades de compra, para 2 personas)
+    """
+    cantidades = {}
+    for momentos in menu_semanal.values():
+        for platos in momentos.values():
+            for plato in platos.values():
+                if plato and 'ingredientes' in plato:
+                    for indice, cantidad in catalogo.lineas_plato(plato):
+                        cantidades[indice] = cantidades.get(indice, 0) + cantidad
+    
+    return totales_por_indice(cantidades, catalogo)
+
+def totales_por_indice(cantidades, catalogo):
+    """
+    Completa cantidades por índice de ingrediente con los datos del catálogo
+    
+    Args:
+        cantidades: Dict índice -> cantidad en unidades de compra
+        catalogo: CatalogoIngredientes con el índice usado
+        
+    Returns:
+        Dict nombre -> datos, en el formato de organizar_lista_compras
+    """
+    nombres = catalogo.nombres
+    infos = catalogo.infos
+    ingredientes_totales = {}
+    for indice, cantidad in cantidades.items():
+        info_ing = infos[indice]
+        ingredientes_totales[nombres[indice]] = {
+            'cantidad': cantidad,
+            'unidad': info_ing['unidad'],
+            'precio_unitario': info_ing['precio'],
+            'categoria': info_ing['categoria'],
+            'venta_por': info_ing.get('venta_por', info_ing['unidad']),
+            'precio_venta': info_ing.get('precio_venta', info_ing['precio'])
+        }
+    return ingredientes_totales
+
+def _totales_desde_json(menu_semanal, db_connection):
+    """Suma las cantidades parseando los ingredientes de cada plato del menú"""
+    ingredientes_totales = defaultdict(lambda: {
+        'cantidad': 0,
+        'unidad': '',
+        'precio_unitario': 0,
+        'categoria': 'otros'
+    })
+    
+    # Recopilar todas las líneas de ingredientes del menú
+    lineas = []
+    for dia, momentos in menu_semanal.items():
+        for momento, platos in momentos.items():
+            for tipo, plato in platos.items():
+                if plato and 'ingredientes' in plato:
+                    try:
+                        # Los ingredientes vienen como JSON string
+                        ingredientes = json.loads(plato['ingredientes'])
+                        
+                        for ing in ingredientes:
+                            lineas.append((
+                                ing['ingrediente'],
+                                float(ing['cantidad']),
+                                ing['unidad']
+                            ))
+                    
+                    except (json.JSONDecodeError, KeyError) as e:
+                        print(f"Error procesando ingredientes de {plato.get('nombre', 'desconocido')}: {e}")
+    
+    # Obtener información de todos los ingredientes en una sola pasada
+    infos = db_connection.get_ingredientes_info(nombre for nombre, _, _ in lineas)
+    
+    for nombre, cantidad, unidad in lineas:
+        info_ing = infos.get(nombre)
+        
+        if info_ing:
+            # Multiplicar por 2 (para 2 personas)
+            cantidad_total = cantidad * 2
+            
+            # Convertir unidades si es necesario
+            if unidad == 'g' and info_ing['unidad'] == 'kg':
+                cantidad_total = cantidad_total / 1000
+            elif unidad == 'ml' and info_ing['unidad'] == 'litro':
+                cantidad_total = cantidad_total / 1000
+            
+            # Acumular cantidades
+            ingredientes_totales[nombre]['cantidad'] += cantidad_total
+            ingredientes_totales[nombre]['unidad'] = info_ing['unidad']
+            ingredientes_totales[nombre]['precio_unitario'] = info_ing['precio']
+            ingredientes_totales[nombre]['categoria'] = info_ing['categoria']
+            ingredientes_totales[nombre]['venta_por'] = info_ing.get('venta_por', info_ing['unidad'])
+            ingredientes_totales[nombre]['precio_venta'] = info_ing.get('precio_venta', info_ing['precio'])
+    
+    return ingredientes_totales
+
 def calcular_info_nutricional(menu_semanal):
     """
     Calcula la información nutricional del menú
@@ -197,12 +280,13 @@ def validar_preferencias(preferencias_tipo, preferencias_categoria):
     
     return preferencias_tipo, preferencias_categoria
 
-def formatear_menu_respuesta(menu_semanal):
+def formatear_menu_respuesta(menu_semanal, incluir_preparacion=True):
     """
     Formatea el menú para la respuesta de la API
     
     Args:
         menu_semanal: Dict con el menú generado
+        incluir_preparacion: Si es False omite el texto de preparación
         
     Returns:
         Dict con el menú formateado
@@ -223,10 +307,90 @@ def formatear_menu_respuesta(menu_semanal):
                         'nombre': plato.get('nombre'),
                         'tipo': plato.get('tipo'),
                         'calorias': plato.get('calorias'),
-                        'precio': plato.get('precio'),
-                        'preparacion': plato.get('preparacion', '')
+                        'precio': plato.get('precio')
                     }
+                    if incluir_preparacion:
+                        menu_formateado[dia][momento][tipo]['preparacion'] = plato.get('preparacion', '')
                 else:
                     menu_formateado[dia][momento][tipo] = None
     
-    return menu_formateado
\ No newline at end of file
+    return menu_formateado
+
+def formatear_menu_compacto(menu_semanal, incluir_preparacion=True):
+    """
+    Formatea el menú con referencias por id y un diccionario único de platos
+    
+    Cada plato aparece una sola vez en 'platos' aunque se repita en la semana;
+    los slots del menú solo guardan su id.
+    
+    Args:
+        menu_semanal: Dict con el menú generado
+        incluir_preparacion: Si es False omite el texto de preparación
+        
+    Returns:
+        Dict con 'formato', 'menu' (ids por slot) y 'platos' (id -> plato)
+    """
+    menu_formateado = formatear_menu_respuesta(menu_semanal, incluir_preparacion)
+    
+    menu_ids = {}
+    platos = {}
+    for dia, momentos in menu_formateado.items():
+        menu_ids[dia] = {}
+        for momento, slots in momentos.items():
+            menu_ids[dia][momento] = {}
+            for tipo, plato in slots.items():
+                if plato:
+                    # Las claves JSON siempre son strings
+                    platos.setdefault(str(plato['id']), plato)
+                    menu_ids[dia][momento][tipo] = plato['id']
+                else:
+                    menu_ids[dia][momento][tipo] = None
+    
+    return {
+        'formato': 'compacto',
+        'menu': menu_ids,
+        'platos': platos
+    }
+
+def es_menu_compacto(datos):
+    """Indica si un menú almacenado está en formato compacto"""
+    return isinstance(datos, dict) and datos.get('formato') == 'compacto'
+
+def expandir_menu_compacto(compacto):
+    """
+    Reconstruye el menú anidado a partir del formato compacto
+    
+    Args:
+        compacto: Dict generado por formatear_menu_compacto
+        
+    Returns:
+        Dict dia -> momento -> componente -> plato
+    """
+    platos = compacto['platos']
+    menu = {}
+    for dia, momentos in compacto['menu'].items():
+        menu[dia] = {}
+        for momento, slots in momentos.items():
+            menu[dia][momento] = {
+                tipo: platos.get(str(plato_id)) if plato_id is not None else None
+                for tipo, plato_id in slots.items()
+            }
+    return menu
+
+def ids_platos_menu(menu_semanal):
+    """
+    Lista los ids de los platos de un menú, con repeticiones
+    
+    Args:
+        menu_semanal: Dict dia -> momento -> componente -> plato
+        
+    Returns:
+        Lista de ids en el orden del menú
+    """
+    return [
+        plato['id']
+        for momentos in menu_semanal.values()
+        for slots in momentos.values()
+        for plato in slots.values()
+        if plato
+    ]
@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+Benchmark offline del pipeline de menús (sin Keyspaces)
+
+Usa lambda/data/platos.json e ingredientes.json como catálogo local y
+catálogos sintéticos escalados (clonando platos con precios y calorías
+perturbados) para medir latencia por etapa, asignaciones y throughput.
+
+Ejemplos:
+    python benchmark-menu.py
+    python benchmark-menu.py --escalas 46,1000,10000 --iteraciones 30
+    python benchmark-menu.py --salida actual.json --comparar base.json
+    python benchmark-menu.py --modo optimo --comparar heuristico.json
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tracemalloc
+from statistics import quantiles
+
+# numpy es opcional (igual que en la Lambda); si está se siembra también
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+DIR_LAMBDA = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda')
+sys.path.insert(0, DIR_LAMBDA)
+
+from ml_model_lite import MenuMLLite
+from catalogo_ingredientes import CatalogoIngredientes
+from utils import calcular_lista_compras, calcular_info_nutricional
+
+PRESUPUESTOS = [80, 150, 250, 400]
+
+PREFERENCIAS = {
+    'sin_preferencias': ([], []),
+    'criolla': (['criolla'], []),
+    'vegetariano': ([], ['vegetariano']),
+    'mixta': (['china', 'marina', 'andina'], ['normal'])
+}
+
+ETAPAS = ['generar_menu_semanal', 'calcular_lista_compras', 'calcular_info_nutricional', 'total']
+
+def cargar_platos_base():
+    """Carga los platos con los ingredientes como JSON string (igual que en la base de datos)"""
+    with open(os.path.join(DIR_LAMBDA, 'data', 'platos.json'), 'r', encoding='utf-8') as f:
+        platos = json.load(f)
+    for plato in platos:
+        plato['ingredientes'] = json.dumps(plato['ingredientes'])
+    return platos
+
+def escalar_catalogo(platos_base, tamano, semilla=42):
+    """Genera un catálogo sintético de `tamano` platos a partir de los reales"""
+    if tamano <= len(platos_base):
+        return platos_base[:tamano]
+
+    rng = random.Random(semilla)
+    platos = list(platos_base)
+    siguiente_id = max(p['id'] for p in platos_base) + 1
+    while len(platos) < tamano:
+        base = rng.choice(platos_base)
+        clon = dict(base)
+        clon['id'] = siguiente_id
+        clon['nombre'] = f"{base['nombre']} #{siguiente_id}"
+        clon['precio'] = round(base['precio'] * rng.uniform(0.7, 1.3), 2)
+        clon['calorias'] = int(base['calorias'] * rng.uniform(0.8, 1.2))
+        platos.append(clon)
+        siguiente_id += 1
+    return platos
+
+def percentiles(valores):
+    """p50/p95/p99 en milisegundos"""
+    if len(valores) < 2:
+        valor = valores[0] if valores else 0.0
+        return {'p50': valor, 'p95': valor, 'p99': valor}
+    cortes = quantiles(valores, n=100, method='inclusive')
+    return {
+        'p50': round(cortes[49], 3),
+        'p95': round(cortes[94], 3),
+        'p99': round(cortes[98], 3)
+    }
+
+def costo_menu(menu):
+    """Costo de los platos del menú para 2 personas (lo que limita el presupuesto)"""
+    return sum(
+        plato['precio'] * 2
+        for momentos in menu.values()
+        for platos in momentos.values()
+        for plato in platos.values()
+        if plato
+    )
+
+def medir_escenario(modelo, catalogo, presupuesto, pref_tipo, pref_cat, iteraciones, modo=None):
+    """
+    Ejecuta el pipeline `iteraciones` veces
+
+    Returns:
+        Tuple con los tiempos por etapa y la fracción del presupuesto usada
+        en cada menú (por precio de platos y por lista de compras)
+    """
+    tiempos = {etapa: [] for etapa in ETAPAS}
+    utilizacion = []
+    utilizacion_compras = []
+
+    for _ in range(iteraciones):
+        t0 = time.perf_counter()
+        menu = modelo.generar_menu_semanal(presupuesto, pref_tipo, pref_cat, modo=modo)
+        t1 = time.perf_counter()
+        lista = calcular_lista_compras(menu, catalogo)
+        t2 = time.perf_counter()
+        calcular_info_nutricional(menu)
+        t3 = time.perf_counter()
+
+        tiempos['generar_menu_semanal'].append((t1 - t0) * 1000)
+        tiempos['calcular_lista_compras'].append((t2 - t1) * 1000)
+        tiempos['calcular_info_nutricional'].append((t3 - t2) * 1000)
+        tiempos['total'].append((t3 - t0) * 1000)
+        utilizacion.append(costo_menu(menu) / presupuesto)
+        utilizacion_compras.append(lista['total'] / presupuesto)
+
+    return tiempos, utilizacion, utilizacion_compras
+
+def medir_asignaciones(modelo, catalogo, presupuesto, pref_tipo, pref_cat):
+    """Pico de memoria asignada (KB) por un menú completo"""
+    tracemalloc.start()
+    menu = modelo.generar_menu_semanal(presupuesto, pref_tipo, pref_cat)
+    calcular_lista_compras(menu, catalogo)
+    calcular_info_nutricional(menu)
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return round(pico / 1024, 1)
+
+def ejecutar(escalas, iteraciones, vectorizado, modo=None, costo_compras=True):
+    """Corre todos los escenarios y devuelve los resultados por escala"""
+    platos_base = cargar_platos_base()
+    catalogo = CatalogoIngredientes.desde_json()
+    resultados = {}
+
+    for escala in escalas:
+        platos = escalar_catalogo(platos_base, escala)
+
+        inicio = time.perf_counter()
+        modelo = MenuMLLite(platos, vectorizado=vectorizado)
+        modelo.entrenar_modelo()
+        if costo_compras:
+            modelo.usar_catalogo(catalogo)
+        construccion_ms = (time.perf_counter() - inicio) * 1000
+
+        tiempos = {etapa: [] for etapa in ETAPAS}
+        utilizacion = []
+        utilizacion_compras = []
+        asignaciones = []
+        inicio = time.perf_counter()
+        menus = 0
+        for presupuesto in PRESUPUESTOS:
+            for pref_tipo, pref_cat in PREFERENCIAS.values():
+                escenario, usado, usado_compras = medir_escenario(
+                    modelo, catalogo, presupuesto, pref_tipo, pref_cat, iteraciones, modo
+                )
+                for etapa in ETAPAS:
+                    tiempos[etapa].extend(escenario[etapa])
+                utilizacion.extend(usado)
+                utilizacion_compras.extend(usado_compras)
+                asignaciones.append(
+                    medir_asignaciones(modelo, catalogo, presupuesto, pref_tipo, pref_cat)
+                )
+                menus += iteraciones
+        duracion = time.perf_counter() - inicio
+
+        resultados[str(escala)] = {
+            'platos': len(platos),
+            'construccionModeloMs': round(construccion_ms, 2),
+            'etapas': {etapa: percentiles(tiempos[etapa]) for etapa in ETAPAS},
+            'picoMemoriaKb': max(asignaciones),
+            # Los menús que se pasan del presupuesto cuentan como > 1
+            'utilizacionPresupuesto': round(sum(utilizacion) / len(utilizacion), 3),
+            'menusFueraDePresupuesto': sum(1 for u in utilizacion if u > 1),
+            # Lo que realmente se paga: la lista de compras con presentaciones
+            'utilizacionCompras': round(sum(utilizacion_compras) / len(utilizacion_compras), 3),
+            'comprasFueraDePresupuesto': sum(1 for u in utilizacion_compras if u > 1),
+            'menusPorSegundo': round(menus / duracion, 1)
+        }
+
+    return resultados
+
+def imprimir(resultados):
+    """Tabla legible de resultados"""
+    for escala, datos in resultados.items():
+        print(f"\n📊 Catálogo de {datos['platos']} platos "
+              f"(modelo en {datos['construccionModeloMs']} ms, "
+              f"{datos['menusPorSegundo']} menús/s, pico {datos['picoMemoriaKb']} KB)")
+        print(f"   Presupuesto usado: {datos['utilizacionPresupuesto'] * 100:.1f}% de media, "
+              f"{datos['menusFueraDePresupuesto']} menús por encima")
+        print(f"   Lista de compras: {datos['utilizacionCompras'] * 100:.1f}% del presupuesto de media, "
+              f"{datos['comprasFueraDePresupuesto']} listas por encima")
+        print(f"   {'etapa':<28}{'p50':>10}{'p95':>10}{'p99':>10}")
+        for etapa, pct in datos['etapas'].items():
+            print(f"   {etapa:<28}{pct['p50']:>10.3f}{pct['p95']:>10.3f}{pct['p99']:>10.3f}")
+
+def comparar(resultados, ruta_base, tolerancia):
+    """
+    Compara el p95 total contra una ejecución previa
+
+    Returns:
+        Lista de regresiones encontradas
+    """
+    with open(ruta_base, 'r', encoding='utf-8') as f:
+        base = json.load(f)['resultados']
+
+    regresiones = []
+    for escala, datos in resultados.items():
+        if escala not in base:
+            continue
+        actual = datos['etapas']['total']['p95']
+        anterior = base[escala]['etapas']['total']['p95']
+        if anterior > 0 and actual > anterior * (1 + tolerancia):
+            regresiones.append(
+                f"{escala} platos: p95 total {anterior:.3f} ms -> {actual:.3f} ms"
+            )
+    return regresiones
+
+def main():
+    """Función principal"""
+    parser = argparse.ArgumentParser(description='Benchmark offline del pipeline de menús')
+    parser.add_argument('--escalas', default='46,1000,10000',
+                        help='Tamaños de catálogo separados por coma (ej. 46,1000,100000)')
+    parser.add_argument('--iteraciones', type=int, default=20,
+                        help='Menús por escenario (presupuesto x preferencias)')
+    parser.add_argument('--sin-vectorizar', action='store_true',
+                        help='Forzar el scoring sin numpy')
+    parser.add_argument('--modo', choices=['heuristico', 'optimo'], default='heuristico',
+                        help='Generación heurística actual u optimizador de presupuesto')
+    parser.add_argument('--sin-costo-compras', action='store_true',
+                        help='Elegir platos por su precio en vez del costo real de compra')
+    parser.add_argument('--semilla', type=int, default=0,
+                        help='Semilla de random y de np.random')
+    parser.add_argument('--salida', help='Guardar resultados en JSON')
+    parser.add_argument('--comparar', help='JSON de una ejecución previa para detectar regresiones')
+    parser.add_argument('--tolerancia', type=float, default=0.2,
+                        help='Aumento relativo de p95 permitido al comparar (0.2 = 20%%)')
+    args = parser.parse_args()
+
+    # El scoring vectorizado y el optimizador sortean con np.random
+    random.seed(args.semilla)
+    if np is not None:
+        np.random.seed(args.semilla)
+    escalas = [int(e) for e in args.escalas.split(',') if e]
+
+    print("🚀 Benchmark del pipeline de menús")
+    print(f"   Escalas: {escalas}, iteraciones por escenario: {args.iteraciones}, modo: {args.modo}")
+
+    resultados = ejecutar(
+        escalas, args.iteraciones,
+        vectorizado=False if args.sin_vectorizar else None,
+        modo=args.modo,
+        costo_compras=not args.sin_costo_compras
+    )
+    imprimir(resultados)
+
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            json.dump({
+                'iteraciones': args.iteraciones,
+                'vectorizado': not args.sin_vectorizar,
+                'modo': args.modo,
+                'costoCompras': not args.sin_costo_compras,
+                'resultados': resultados
+            }, f, indent=2)
+        print(f"\n✅ Resultados guardados en {args.salida}")
+
+    if args.comparar:
+        regresiones = comparar(resultados, args.comparar, args.tolerancia)
+        if regresiones:
+            print("\n❌ Regresiones detectadas:")
+            for regresion in regresiones:
+                print(f"   - {regresion}")
+            sys.exit(1)
+        print("\n✅ Sin regresiones respecto a la base")
+
+if __name__ == '__main__':
+    main()
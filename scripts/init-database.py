@@ -6,6 +6,7 @@ Script para inicializar la base de datos con todos los platos e ingredientes
 import os
 import json
 import ssl
+import time
 from cassandra.cluster import Cluster
 from cassandra.auth import PlainTextAuthProvider
 from cassandra.policies import DCAwareRoundRobinPolicy
@@ -115,6 +116,78 @@ def insert_ingredientes(session):
     
     print(f"✅ {count} ingredientes insertados, {errors} errores")
 
+def esperar_tabla_activa(session, tabla, timeout=120, intervalo=2):
+    """
+    Espera a que Keyspaces termine de crear una tabla
+    
+    CREATE TABLE vuelve en cuanto se acepta, pero la tabla queda en estado
+    CREATING hasta que está lista: escribir antes falla.
+    """
+    consulta = session.prepare(
+        "SELECT status FROM system_schema_mcs.tables WHERE keyspace_name = ? AND table_name = ?"
+    )
+    # Las tablas de sistema se leen con LOCAL_ONE
+    consulta.consistency_level = ConsistencyLevel.LOCAL_ONE
+    limite = time.monotonic() + timeout
+    while True:
+        row = session.execute(consulta, [session.keyspace, tabla]).one()
+        estado = row.status if row else None
+        if estado == 'ACTIVE':
+            return
+        if time.monotonic() > limite:
+            raise TimeoutError(f"La tabla {tabla} sigue en estado {estado} tras {timeout} s")
+        print(f"  ⏳ Tabla {tabla} en estado {estado}, esperando...")
+        time.sleep(intervalo)
+
+def crear_tablas_feedback(session):
+    """Crea las tablas de feedback que usa la Lambda (agregados por plato y menús valorados)"""
+    print("\nCreando tablas de feedback...")
+    
+    # Tabla de contadores: solo puede tener la clave y columnas counter
+    session.execute(
+        """
+        CREATE TABLE IF NOT EXISTS features_platos (
+            plato_id int PRIMARY KEY,
+            selecciones counter,
+            suma_satisfaccion counter,
+            valoraciones counter
+        )
+        """
+    )
+    
+    session.execute(
+        """
+        CREATE TABLE IF NOT EXISTS feedback_menus (
+            user_id uuid,
+            fecha_generacion timestamp,
+            fecha_feedback timestamp,
+            PRIMARY KEY (user_id, fecha_generacion)
+        )
+        """
+    )
+    
+    for tabla in ('features_platos', 'feedback_menus'):
+        esperar_tabla_activa(session, tabla)
+    print("✅ Tablas features_platos y feedback_menus listas")
+
+def publicar_version_catalogo(session):
+    """Publica el sello de versión para que los contenedores recarguen el catálogo"""
+    session.execute(
+        """
+        CREATE TABLE IF NOT EXISTS catalogo_metadata (
+            clave text PRIMARY KEY,
+            valor text
+        )
+        """
+    )
+    esperar_tabla_activa(session, 'catalogo_metadata')
+    
+    version = datetime.now().isoformat()
+    prepared = session.prepare("INSERT INTO catalogo_metadata (clave, valor) VALUES (?, ?)")
+    prepared.consistency_level = ConsistencyLevel.LOCAL_QUORUM
+    session.execute(prepared, ['version', version])
+    print(f"✅ Versión del catálogo publicada: {version}")
+
 def main():
     """Función principal"""
     print("🚀 Iniciando carga de datos en Amazon Keyspaces")
@@ -129,6 +202,8 @@ def main():
         # Insertar datos
         insert_platos(session)
         insert_ingredientes(session)
+        crear_tablas_feedback(session)
+        publicar_version_catalogo(session)
         
         # Insertar algunos datos de prueba
         print("\nInsertando datos de prueba...")